@@ -1,6 +1,7 @@
 from graphene_directives import DirectiveLocation
 
 from .apollo_versions import FederationVersion, LATEST_VERSION, STABLE_VERSION
+from .cache import EntityCache
 from .composable_directive import ComposableDirective
 from .directives import (
     authenticated,
@@ -17,9 +18,10 @@ from .directives import (
     shareable,
     tag,
 )
+from .entity import key_resolver
 from .schema import build_schema
 from .schema_directives import compose_directive, link_directive
-from .service import get_sdl
+from .service import get_sdl, get_sdl_response
 
 __all__ = [
     "FederationVersion",
@@ -27,6 +29,7 @@ __all__ = [
     "STABLE_VERSION",
     "build_schema",
     "ComposableDirective",
+    "EntityCache",
     "DirectiveLocation",
     "authenticated",
     "extends",
@@ -34,6 +37,7 @@ __all__ = [
     "inaccessible",
     "interface_object",
     "key",
+    "key_resolver",
     "override",
     "provides",
     "policy",
@@ -44,4 +48,5 @@ __all__ = [
     "compose_directive",
     "link_directive",
     "get_sdl",
+    "get_sdl_response",
 ]
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class EntityCache:
+    """
+    LRU cache of the resolved entities, keyed on the type name and the canonical key
+    of their representation (its `@key` and `@requires` fields).
+
+    Pass an instance to `build_schema(entity_cache=...)` to share it across requests,
+    or `entity_cache=True` to use a new unbounded cache per request.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        """
+        :param max_size: max number of entities kept, the least recently used are evicted first
+        :param ttl: number of seconds an entity is kept
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[
+            Hashable, tuple[Optional[float], Any]
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get a cached entity, counting the hits and misses.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Cache an entity, evicting the least recently used ones beyond max_size.
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            if self.max_size is not None:
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Remove all the cached entities and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
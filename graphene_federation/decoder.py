@@ -0,0 +1,367 @@
+from __future__ import annotations
+
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Type, cast
+
+from graphene import Enum, Interface, List, NonNull, ObjectType, Scalar, Union
+from graphene_directives import Schema
+from graphql import GraphQLError
+
+
+class RepresentationLimitError(GraphQLError):
+    """
+    Raised when the representations of an _entities call exceed the configured limits.
+    """
+
+
+def _has_generated_init(model: Type[ObjectType]) -> bool:
+    """
+    Check if the model is initialized by the dataclass __init__ graphene generates
+    for each ObjectType (set on the InterObjectType class right after it in the MRO).
+    """
+    if not issubclass(model, ObjectType):
+        return False
+    init_cls = next(cls for cls in model.__mro__ if "__init__" in vars(cls))
+    return init_cls is model.__mro__[1] and init_cls.__name__ == "InterObjectType"
+
+
+class RepresentationDecoder:
+    """
+    Decoder plan of the representations of a type, compiled once when the schema is built.
+
+    It holds the mapping of the schema field names to the attribute names of the model,
+    the functions coercing the values of the leaf fields (enums and scalars, or lists of them)
+    and the type of the nested object fields (or lists of objects) to decode.
+    """
+
+    def __init__(
+        self,
+        decoders: RepresentationDecoders,
+        model: Type[ObjectType],
+        field_names: Dict[str, str],
+        defaults: Optional[Dict[str, Any]] = None,
+        ignore_unknown: bool = False,
+    ):
+        """
+        :param decoders: registry of the decoder plans of the nested types
+        :param model: graphene type of the representations
+        :param field_names: schema field name -> attribute name
+        :param defaults: attribute name -> default value, to build the instances
+            without calling the model __init__ (None if the model defines its own)
+        :param ignore_unknown: skip the fields missing from field_names
+            (they are passed as is to the model otherwise)
+        """
+        self.decoders = decoders
+        self.model = model
+        self.field_names = field_names
+        self.defaults = defaults
+        self.ignore_unknown = ignore_unknown
+        self.coercions: Dict[str, Callable[[Any], Any]] = {}
+        # Type name (or restricted decoder plan) of the nested object fields
+        self.nested: Dict[str, str | RepresentationDecoder] = {}
+
+    def arguments(self, representation: Mapping[str, Any]) -> dict:
+        """
+        Get the attribute values of a representation, with its leaf fields coerced.
+
+        The values are read from the representation in a single pass,
+        the returned dict being the only one built.
+        """
+        field_names = self.field_names
+        coercions = self.coercions
+        ignore_unknown = self.ignore_unknown
+        model_arguments = {}
+        for field_name, value in representation.items():
+            if field_name == "__typename":
+                continue
+            model_field = field_names.get(field_name)
+            if model_field is None:
+                if ignore_unknown:
+                    continue
+                model_field = field_name
+            if value is not None:
+                coerce = coercions.get(model_field)
+                if coerce is not None:
+                    value = coerce(value)
+            model_arguments[model_field] = value
+        return model_arguments
+
+    def decode(
+        self,
+        representation: Mapping[str, Any],
+        max_depth: Optional[int] = None,
+        max_nodes: Optional[int] = None,
+    ) -> ObjectType:
+        """
+        Create an instance of the model from the given representation.
+
+        :param representation: representation to decode, left untouched
+        :param max_depth: max nesting depth of the objects of the representation
+        :param max_nodes: max number of objects in the representation
+        """
+        return self.build(*self.collect(representation, max_depth, max_nodes))
+
+    def collect(
+        self,
+        representation: Mapping[str, Any],
+        max_depth: Optional[int] = None,
+        max_nodes: Optional[int] = None,
+        decoded_nodes: int = 0,
+    ) -> tuple[list[Any], list[tuple[RepresentationDecoder, dict, Any, Any]]]:
+        """
+        Collect the objects of a representation to build, without building them.
+
+        The nested objects are walked with an explicit work stack instead of recursive calls,
+        parent first. The representation (any read only mapping) is left untouched.
+        The walk stops as soon as one of the limits is exceeded.
+
+        :param decoded_nodes: number of objects already decoded, counted in max_nodes
+
+        :return: the slot of the root object and the (decoder, attribute values, container, slot)
+            of each object
+        """
+        get_decoder = self.decoders.get
+        root: list[Any] = [None]
+        nodes: list[tuple[RepresentationDecoder, dict, Any, Any]] = []
+        # (value, default type name or decoder, container, slot, depth) of the values to decode
+        stack: list[tuple[Any, Any, Any, Any, int]] = [
+            (representation, None, root, 0, 1)
+        ]
+        while stack:
+            value, type_name, container, slot, depth = stack.pop()
+            if isinstance(value, (list, tuple)):
+                items = list(value)
+                container[slot] = items
+                for item_slot, item in enumerate(items):
+                    if item is not None:
+                        stack.append((item, type_name, items, item_slot, depth))
+                continue
+
+            if not isinstance(value, dict) and not isinstance(value, Mapping):
+                continue
+
+            if max_depth is not None and depth > max_depth:
+                raise RepresentationLimitError(
+                    f"Representation exceeds the max nesting depth of {max_depth}"
+                )
+            if max_nodes is not None and decoded_nodes + len(nodes) >= max_nodes:
+                raise RepresentationLimitError(
+                    f"Representations exceed the max number of {max_nodes} objects"
+                )
+
+            if type_name is None:
+                decoder = self
+            elif isinstance(type_name, RepresentationDecoder):
+                decoder = type_name
+            else:
+                decoder = get_decoder(value.get("__typename") or type_name)
+            model_arguments = decoder.arguments(value)
+            nodes.append((decoder, model_arguments, container, slot))
+            for model_field, nested_type_name in decoder.nested.items():
+                nested_value = model_arguments.get(model_field)
+                if nested_value is not None:
+                    stack.append(
+                        (
+                            nested_value,
+                            nested_type_name,
+                            model_arguments,
+                            model_field,
+                            depth + 1,
+                        )
+                    )
+
+        return root, nodes
+
+    @staticmethod
+    def build(
+        root: list[Any], nodes: list[tuple[RepresentationDecoder, dict, Any, Any]]
+    ) -> ObjectType:
+        """
+        Build the collected objects in the reverse order,
+        so that each object is built after the objects of its fields.
+        """
+        for decoder, model_arguments, container, slot in reversed(nodes):
+            container[slot] = decoder.construct(model_arguments)
+
+        return root[0]
+
+    def construct(self, model_arguments: dict) -> ObjectType:
+        """
+        Create an instance of the model from its attribute values.
+
+        When the model uses the __init__ generated by graphene, the attributes are set
+        directly, which skips the generic keyword arguments handling of that __init__.
+        """
+        defaults = self.defaults
+        if defaults is None or not model_arguments.keys() <= defaults.keys():
+            # Unknown attributes go through __init__ to raise the usual TypeError
+            return self.model(**model_arguments)
+
+        instance = cast(Any, self.model).__new__(self.model)
+        instance.__dict__.update(defaults)
+        instance.__dict__.update(model_arguments)
+        return instance
+
+
+class RepresentationDecoders:
+    """
+    Registry of the decoder plans of the types of a schema.
+
+    The plans of the nested types are compiled along with the plan of their parent,
+    so that no reflection on the graphene types is needed when decoding.
+    """
+
+    def __init__(self, schema: Schema):
+        self.schema = schema
+        self.decoders: Dict[str, RepresentationDecoder] = {}
+
+    def get(self, type_name: str) -> RepresentationDecoder:
+        """
+        Get the decoder plan of a type, compiling it if needed.
+        """
+        decoder = self.decoders.get(type_name)
+        if decoder is None:
+            decoder = self._compile(
+                self.schema.graphql_schema.get_type(type_name).graphene_type
+            )
+        return decoder
+
+    @property
+    def field_names(self) -> Mapping[str, Mapping[str, str]]:
+        """
+        Mapping of the schema field names to the attribute names, per type name.
+        """
+        return MappingProxyType(
+            {
+                type_name: MappingProxyType(decoder.field_names)
+                for type_name, decoder in self.decoders.items()
+            }
+        )
+
+    def restrict(
+        self, decoder: RepresentationDecoder, field_set: Dict[str, dict]
+    ) -> RepresentationDecoder:
+        """
+        Get a copy of a decoder plan only decoding the fields of a field set
+        (e.g. the `@key` and `@requires` fields of an entity), the other fields being ignored.
+
+        The nested object fields are restricted to their sub selection,
+        the nested interfaces and unions are decoded entirely.
+
+        :param decoder: decoder plan of the type
+        :param field_set: AST of the field set, with the field names of the schema
+        """
+        restricted = RepresentationDecoder(
+            self,
+            decoder.model,
+            {
+                field_name: attr_name
+                for field_name, attr_name in decoder.field_names.items()
+                if field_name in field_set
+            },
+            decoder.defaults,
+            ignore_unknown=True,
+        )
+        for field_name, attr_name in restricted.field_names.items():
+            coerce = decoder.coercions.get(attr_name)
+            if coerce is not None:
+                restricted.coercions[attr_name] = coerce
+
+            nested = decoder.nested.get(attr_name)
+            if nested is None:
+                continue
+            nested_decoder = (
+                nested
+                if isinstance(nested, RepresentationDecoder)
+                else self.decoders.get(nested)
+            )
+            if field_set[field_name] and nested_decoder is not None:
+                restricted.nested[attr_name] = self.restrict(
+                    nested_decoder, field_set[field_name]
+                )
+            else:
+                restricted.nested[attr_name] = nested
+        return restricted
+
+    def _compile(self, model: Type[ObjectType]) -> RepresentationDecoder:
+        model_fields = getattr(model._meta, "fields", {})  # noqa
+        field_names = {}
+        for attr_name, field in model_fields.items():
+            field_name = field.name or self.schema.type_attribute_to_field_name(
+                attr_name
+            )
+            field_names[field_name] = attr_name
+
+        decoder = RepresentationDecoder(
+            self,
+            model,
+            field_names,
+            {
+                attr_name: field.default_value
+                for attr_name, field in model_fields.items()
+            }
+            if _has_generated_init(model)
+            else None,
+        )
+        # Register before compiling the fields, to support self referencing types
+        self.decoders[model._meta.name] = decoder  # noqa
+
+        for attr_name, field in model_fields.items():
+            nested_type_name = self._compile_nested(field.type)
+            if nested_type_name is not None:
+                decoder.nested[attr_name] = nested_type_name
+                continue
+
+            coerce = self._compile_coercion(field.type)
+            if coerce is not None:
+                decoder.coercions[attr_name] = coerce
+        return decoder
+
+    def _compile_nested(self, field_type: Any) -> Optional[str]:
+        """
+        Get the name of the object type of a field (or of the items of a list field),
+        None if the field is not an object.
+        """
+        while isinstance(field_type, (NonNull, List)):
+            field_type = field_type.of_type
+
+        if not isinstance(field_type, type) or not issubclass(
+            field_type, (ObjectType, Interface, Union)
+        ):
+            return None
+
+        type_name = cast(Type[ObjectType], field_type)._meta.name  # noqa
+        if issubclass(field_type, ObjectType):
+            self.get(type_name)
+        return type_name
+
+    def _compile_coercion(self, field_type: Any) -> Optional[Callable[[Any], Any]]:
+        """
+        Build the function converting a value of the given leaf graphene type.
+        """
+        if isinstance(field_type, NonNull):
+            return self._compile_coercion(field_type.of_type)
+
+        if isinstance(field_type, List):
+            coerce_item = self._compile_coercion(field_type.of_type)
+            if coerce_item is None:
+                return None
+
+            def coerce_list(value):
+                if not isinstance(value, (list, tuple)):
+                    return value
+                return [coerce_item(v) if v is not None else None for v in value]
+
+            return coerce_list
+
+        if not isinstance(field_type, type):
+            return None
+
+        if issubclass(field_type, Enum):
+            enum = cast(Type[Enum], field_type)._meta.enum  # noqa
+            return lambda value: enum[value]
+
+        if issubclass(field_type, Scalar):
+            return getattr(field_type, "parse_value", None)
+
+        return None
@@ -1,27 +1,45 @@
 from __future__ import annotations
 
-from typing import Any
+from concurrent.futures import Executor
+from types import MappingProxyType
+from typing import Any, Callable, Iterable, Mapping, Optional
 from typing import Dict, Type
 
-from graphene import Enum, Field, List, NonNull, ObjectType, Scalar, Union
+from graphene import Interface, List, NonNull, ObjectType, Union
 from graphene.types.schema import TypeMap
 from graphene_directives import Schema
-from graphene_directives.utils import has_non_field_attribute
+from graphene_directives.utils import (
+    get_field_attribute_value,
+    get_non_field_attribute_value,
+    has_field_attribute,
+    has_non_field_attribute,
+)
 
 from .apollo_versions import LATEST_VERSION, get_directive_from_name
+from .cache import EntityCache
+from .decoder import RepresentationDecoder, RepresentationDecoders
+from .resolver import EntityResolver
 from .scalars import _Any
+from .transform import field_set_case_transform
+from .validators import InternalNamespace, ast_to_str, build_ast
+
+KEY_RESOLVER_ATTRIBUTE = "_federation_key_fields"
 
 
 def get_entities(schema: Schema) -> Dict[str, Any]:
     """
     Find all the entities from the type map.
     They can be easily distinguished from the other type as
-    the `@key` and `@extend` decorators adds a `_sdl` attribute to them.
+    the `@key`, `@extend` and `@interfaceObject` decorators adds a `_sdl` attribute to them.
+    Interfaces with a `@key` are entities too.
     """
     type_map: TypeMap = schema.graphql_schema.type_map
     entities = {}
     key_directive = get_directive_from_name("key", LATEST_VERSION)
     extends_directive = get_directive_from_name("extends", LATEST_VERSION)
+    interface_object_directive = get_directive_from_name(
+        "interfaceObject", LATEST_VERSION
+    )
     for type_name, type_ in type_map.items():
         if not hasattr(type_, "graphene_type"):
             continue
@@ -31,6 +49,7 @@ def get_entities(schema: Schema) -> Dict[str, Any]:
             [
                 has_non_field_attribute(graphene_type, key_directive),
                 has_non_field_attribute(graphene_type, extends_directive),
+                has_non_field_attribute(graphene_type, interface_object_directive),
             ]
         )
         if is_entity:
@@ -38,6 +57,299 @@ def get_entities(schema: Schema) -> Dict[str, Any]:
     return entities
 
 
+def get_entity_key_fields(schema: Schema, model: Type[ObjectType]) -> list[dict]:
+    """
+    Get the field sets of the `@key` directives of an entity as ASTs
+    (using the field names of the schema).
+    """
+    key_directive = get_directive_from_name("key", LATEST_VERSION)
+    if not has_non_field_attribute(model, key_directive):
+        return []
+    return [
+        build_ast(
+            fields=field_set_case_transform(dict(inputs), schema)["fields"],
+            directive_name=str(key_directive),
+        )
+        for inputs in get_non_field_attribute_value(model, key_directive)
+    ]
+
+
+def get_entity_requires_fields(schema: Schema, model: Type[ObjectType]) -> list[dict]:
+    """
+    Get the field sets of the `@requires` directives of the fields of an entity as ASTs
+    (using the field names of the schema).
+    """
+    requires_directive = get_directive_from_name("requires", LATEST_VERSION)
+    return [
+        build_ast(
+            fields=field_set_case_transform(dict(inputs), schema)["fields"],
+            directive_name=str(requires_directive),
+        )
+        # The directives are set on the fields declared on the class
+        for field in (
+            getattr(model, attr_name, None)
+            for attr_name in getattr(model._meta, "fields", {})  # noqa
+        )
+        if has_field_attribute(field, requires_directive)
+        for inputs in get_field_attribute_value(field, requires_directive)
+    ]
+
+
+def merge_field_sets(field_sets: Iterable[dict]) -> dict:
+    """
+    Merge field set ASTs into a single one selecting all their fields.
+    """
+    merged: dict = {}
+    stack = [(merged, field_set) for field_set in field_sets]
+    while stack:
+        target, field_set = stack.pop()
+        for field, sub_field_set in field_set.items():
+            stack.append((target.setdefault(field, {}), sub_field_set))
+    return merged
+
+
+def get_reference_resolver(model: Type[ObjectType]) -> Optional[Callable]:
+    """
+    Get the `__resolve_reference` (or `_resolve_reference`) method of an entity.
+    """
+    return getattr(model, "_%s__resolve_reference" % model.__name__, None) or getattr(
+        model, "_resolve_reference", None
+    )
+
+
+def get_batch_reference_resolver(model: Type[ObjectType]) -> Optional[Callable]:
+    """
+    Get the `__resolve_references` (or `_resolve_references`) classmethod of an entity.
+
+    It receives all the instances of the entity requested in a single `_entities` call
+    and must return the resolved entities in the same order.
+    """
+    return getattr(model, "_%s__resolve_references" % model.__name__, None) or getattr(
+        model, "_resolve_references", None
+    )
+
+
+def key_resolver(
+    fields: str | list[str], *, auto_case: bool = True
+) -> Callable[[Callable], classmethod]:
+    """
+    Registers a batch reference resolver of an entity for one of its `@key` field sets.
+
+    The representations carrying the top level fields of that key are resolved with it,
+    the other ones with the `__resolve_references` / `__resolve_reference` of the entity.
+    Like `__resolve_references`, it is a classmethod receiving the instances and the info,
+    and returning the resolved entities in the same order.
+
+    :param fields: field set of the `@key`, as given to the `key` decorator
+    :param auto_case: same as the `auto_case` of the `key` decorator
+    """
+    fields = ast_to_str(
+        build_ast(
+            fields=fields if isinstance(fields, str) else " ".join(fields),
+            directive_name="@key",
+        )
+    )
+    if not auto_case:
+        fields = f"{InternalNamespace.NO_AUTO_CASE.value} {fields}"
+
+    def wrapper(method: Callable | classmethod) -> classmethod:
+        if not isinstance(method, classmethod):
+            method = classmethod(method)
+        setattr(method.__func__, KEY_RESOLVER_ATTRIBUTE, fields)
+        return method
+
+    return wrapper
+
+
+def get_key_resolvers(model: Type[ObjectType]) -> Dict[str, Callable]:
+    """
+    Get the batch reference resolvers of an entity registered with `key_resolver`,
+    per field set of `@key`.
+    """
+    resolvers = {}
+    for cls in reversed(model.__mro__):
+        for attr_name, value in vars(cls).items():
+            if isinstance(value, classmethod) and hasattr(
+                value.__func__, KEY_RESOLVER_ATTRIBUTE
+            ):
+                fields = getattr(value.__func__, KEY_RESOLVER_ATTRIBUTE)
+                resolvers[fields] = getattr(model, attr_name)
+    return resolvers
+
+
+def get_reference_type_resolver(model: Type[Interface]) -> Optional[Callable]:
+    """
+    Get the `__resolve_reference_types` (or `_resolve_reference_types`) classmethod
+    of an interface entity.
+
+    It receives all the representations of the interface requested in a single `_entities` call
+    and must return the concrete type (the ObjectType or its name) of each of them, in the same order.
+    """
+    return getattr(
+        model, "_%s__resolve_reference_types" % model.__name__, None
+    ) or getattr(model, "_resolve_reference_types", None)
+
+
+class EntityDescriptor:
+    """
+    Everything needed to resolve the representations of an entity type,
+    gathered once when the schema is built.
+
+    An entity with resolvers registered per `@key` field set has one descriptor per such key
+    (in `key_descriptors`, with the top level fields of the key), which `route` selects
+    from the fields of each representation.
+    """
+
+    __slots__ = (
+        "type_name",
+        "model",
+        "resolver",
+        "batch_resolver",
+        "decoder",
+        "key_field_sets",
+        "key_fields",
+        "field_set",
+        "key_descriptors",
+        "type_resolver",
+        "implementations",
+        "_routes",
+    )
+
+    def __init__(
+        self,
+        type_name: str,
+        model: Type[ObjectType],
+        decoder: RepresentationDecoder,
+        key_field_sets: list[dict],
+        field_set: Optional[dict] = None,
+    ):
+        """
+        :param type_name: name of the entity type in the schema
+        :param model: graphene type of the entity
+        :param decoder: decoder plan of the representations of the entity
+        :param key_field_sets: field sets of the `@key` directives of the entity, as ASTs
+        :param field_set: fields decoded from the representations (the key and required fields),
+            which identify the resolved entity, as an AST (None for all the fields)
+        """
+        self.type_name = type_name
+        self.model = model
+        self.resolver = get_reference_resolver(model)
+        self.batch_resolver = get_batch_reference_resolver(model)
+        self.decoder = decoder
+        self.key_field_sets = tuple(key_field_sets)
+        # Top level fields of all the key field sets
+        self.key_fields = frozenset(
+            field for field_set in key_field_sets for field in field_set
+        )
+        self.field_set = field_set
+        self.key_descriptors: tuple[tuple[frozenset[str], EntityDescriptor], ...] = ()
+        # Concrete type resolution of the interface entities
+        self.type_resolver = (
+            get_reference_type_resolver(model) if issubclass(model, Interface) else None
+        )
+        self.implementations: frozenset[str] = frozenset()
+        # Descriptor selected per set of key fields of the representations
+        self._routes: Dict[frozenset[str], EntityDescriptor] = {}
+
+    def add_key_resolver(self, key_field_set: dict, batch_resolver: Callable) -> None:
+        """
+        Route the representations carrying the top level fields of a key to its resolver.
+
+        :param key_field_set: field set of the `@key`, as an AST
+        :param batch_resolver: batch reference resolver of the key
+        """
+        descriptor = EntityDescriptor(
+            self.type_name, self.model, self.decoder, [key_field_set], self.field_set
+        )
+        descriptor.resolver = None
+        descriptor.batch_resolver = batch_resolver
+        # The most specific keys are matched first
+        self.key_descriptors = tuple(
+            sorted(
+                (*self.key_descriptors, (frozenset(key_field_set), descriptor)),
+                key=lambda item: -len(item[0]),
+            )
+        )
+
+    def route(self, representation: Mapping[str, Any]) -> EntityDescriptor:
+        """
+        Get the descriptor resolving a representation:
+        the one of the first key whose top level fields are all in the representation,
+        or this one.
+        """
+        if not self.key_descriptors:
+            return self
+
+        # Only the key fields select the descriptor: memoizing on them bounds the routes
+        # whatever the other fields sent
+        fields = self.key_fields.intersection(representation)
+        route = self._routes.get(fields)
+        if route is not None:
+            return route
+
+        descriptor: EntityDescriptor = next(
+            (
+                key_descriptor
+                for key_fields, key_descriptor in self.key_descriptors
+                if key_fields <= fields
+            ),
+            self,
+        )
+        self._routes[fields] = descriptor
+        return descriptor
+
+
+def get_entity_descriptors(
+    schema: Schema,
+    entities: Dict[str, Type[ObjectType]],
+    decoders: RepresentationDecoders,
+) -> Mapping[str, EntityDescriptor]:
+    """
+    Build the read only table of the entity descriptors, per type name.
+    """
+    key_directive = get_directive_from_name("key", LATEST_VERSION)
+    descriptors = {}
+    for type_name, model in entities.items():
+        key_field_sets = get_entity_key_fields(schema, model)
+        decoder = decoders.get(type_name)
+        field_set = None
+        if key_field_sets:
+            # Only the key and required fields are sent by the router
+            field_set = merge_field_sets(
+                [*key_field_sets, *get_entity_requires_fields(schema, model)]
+            )
+            decoder = decoders.restrict(decoder, field_set)
+        descriptor = descriptors[type_name] = EntityDescriptor(
+            type_name, model, decoder, key_field_sets, field_set
+        )
+        if issubclass(model, Interface):
+            descriptor.implementations = frozenset(
+                name
+                for name, implementation in entities.items()
+                if issubclass(implementation, ObjectType)
+                and model in implementation._meta.interfaces  # noqa
+            )
+
+        key_resolvers = get_key_resolvers(model)
+        if not key_resolvers:
+            continue
+        # The key field sets are in the order of the @key values of the model
+        key_values = [
+            inputs["fields"]
+            for inputs in get_non_field_attribute_value(model, key_directive)
+        ]
+        for fields, batch_resolver in key_resolvers.items():
+            if fields not in key_values:
+                raise ValueError(
+                    f"{model.__name__} has a key resolver for fields "
+                    f"{fields!r} which are not the fields of one of its @key"
+                )
+            descriptor.add_key_resolver(
+                key_field_sets[key_values.index(fields)], batch_resolver
+            )
+    return MappingProxyType(descriptors)
+
+
 def get_entity_cls(entities: Dict[str, Any]) -> Type[Union]:
     """
     Create _Entity type which is a union of all the entity types.
@@ -50,17 +362,72 @@ def get_entity_cls(entities: Dict[str, Any]) -> Type[Union]:
     return _Entity
 
 
-def get_entity_query(schema: Schema):
+def get_entity_query(
+    schema: Schema,
+    concurrency_limit: Optional[int] = None,
+    dataloader: bool = False,
+    deduplication: bool = True,
+    cache: bool | EntityCache = False,
+    executor: Optional[Executor] = None,
+    max_representations: Optional[int] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    timeout: Optional[float] = None,
+    chunk_size: Optional[int] = None,
+):
     """
     Create Entity query.
+
+    :param schema: schema to find the entities from
+    :param concurrency_limit: max number of async reference resolvers awaited at the same time
+    :param dataloader: resolve the references through a per request DataLoader of each entity type
+    :param deduplication: resolve the representations sharing the same key only once per call
+    :param cache: EntityCache shared across the requests, or True for a cache per request
+    :param executor: executor (e.g. a bounded ThreadPoolExecutor) running the blocking reference resolvers
+    :param max_representations: max number of representations per call
+    :param max_depth: max nesting depth of the objects of a representation
+    :param max_nodes: max number of objects decoded per call, over all the representations
+    :param timeout: number of seconds after which the resolution of the entities of a call is stopped
+    :param chunk_size: resolve the representations of a call by chunks of this size,
+        produced one after the other while the result is serialized
     """
     entities_dict = get_entities(schema)
     if not entities_dict:
         return
 
-    entity_type = get_entity_cls(entities_dict)
+    # The _Entity union only holds the object types, the interface entities are
+    # resolved to their implementations
+    entity_type = get_entity_cls(
+        {
+            type_name: model
+            for type_name, model in entities_dict.items()
+            if issubclass(model, ObjectType)
+        }
+    )
+
+    # Compile the decoder plans of the entities (and of their nested types) once
+    decoders = RepresentationDecoders(schema)
+    descriptors = get_entity_descriptors(schema, entities_dict, decoders)
+
+    resolver = EntityResolver(
+        schema,
+        descriptors,
+        concurrency_limit=concurrency_limit,
+        dataloader=dataloader,
+        deduplication=deduplication,
+        cache=cache,
+        executor=executor,
+        max_representations=max_representations,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        timeout=timeout,
+        chunk_size=chunk_size,
+    )
 
     class EntityQuery:
+        representation_decoders = decoders
+        entity_descriptors = descriptors
+
         entities = List(
             entity_type,
             name="_entities",
@@ -68,79 +435,7 @@ def get_entity_query(schema: Schema):
             required=True,
         )
 
-        def resolve_entities(self, info, representations, sub_field_resolution=False):
-            entities = []
-            for representation in representations:
-                type_ = schema.graphql_schema.get_type(representation["__typename"])
-                model = type_.graphene_type
-                model_arguments = representation.copy()
-                model_arguments.pop("__typename")
-                if schema.auto_camelcase:
-                    get_model_attr = schema.field_name_to_type_attribute(model)
-                    model_arguments = {
-                        get_model_attr(k): v for k, v in model_arguments.items()
-                    }
-
-                # convert subfields of models from dict to a corresponding graphql type,
-                # This will be useful when @requires is used
-                for model_field, value in model_arguments.items():
-                    if not hasattr(model, model_field):
-                        continue
-
-                    field = getattr(model, model_field)
-                    if isinstance(field, Field) and isinstance(value, dict):
-                        if value.get("__typename") is None:
-                            value["__typename"] = field.type.of_type._meta.name  # noqa
-                        model_arguments[model_field] = EntityQuery.resolve_entities(
-                            self,
-                            info,
-                            representations=[value],
-                            sub_field_resolution=True,
-                        ).pop()
-                    elif all(
-                        [
-                            isinstance(field, List),
-                            isinstance(value, list),
-                            any(
-                                [
-                                    (
-                                        hasattr(field, "of_type")
-                                        and issubclass(field.of_type, ObjectType)
-                                    ),
-                                    (
-                                        hasattr(field, "of_type")
-                                        and issubclass(field.of_type, Union)
-                                    ),
-                                ]
-                            ),
-                        ]
-                    ):
-                        for sub_value in value:
-                            if sub_value.get("__typename") is None:
-                                sub_value[
-                                    "__typename"
-                                ] = field.of_type._meta.name  # noqa
-                        model_arguments[model_field] = EntityQuery.resolve_entities(
-                            self, info, representations=value, sub_field_resolution=True
-                        )
-                    elif isinstance(field, Scalar) and getattr(
-                        field, "parse_value", None
-                    ):
-                        model_arguments[model_field] = field.parse_value(value)
-                    elif isinstance(field, Enum):
-                        model_arguments[model_field] = field._meta.enum[value]  # noqa
-
-                model_instance = model(**model_arguments)
-
-                resolver = getattr(
-                    model, "_%s__resolve_reference" % model.__name__, None
-                ) or getattr(model, "_resolve_reference", None)
-
-                if resolver and not sub_field_resolution:
-                    model_instance = resolver(model_instance, info)
-
-                entities.append(model_instance)
-
-            return entities
+        def resolve_entities(self, info, representations):
+            return resolver.resolve_entities(info, representations)
 
     return EntityQuery
@@ -0,0 +1,846 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import Executor, Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from inspect import CORO_CREATED, getcoroutinestate, isawaitable, iscoroutine
+from operator import itemgetter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    Mapping,
+    Optional,
+)
+
+from graphene import Interface, ObjectType
+from graphene.utils.dataloader import DataLoader
+from graphene_directives import Schema
+from graphql import GraphQLError
+
+from .cache import EntityCache
+from .decoder import RepresentationLimitError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .entity import EntityDescriptor
+
+REQUEST_STATE_KEY = "_federation_entities"
+
+_MISSING = object()
+
+
+class EntityTimeoutError(GraphQLError):
+    """
+    Set on the entities not resolved before the deadline of their _entities call.
+    """
+
+    def __init__(self, message: str = "Entity resolution exceeded its deadline"):
+        super().__init__(message)
+
+
+# Markers of the start and end of the mappings and lists in the frozen values
+_MAPPING = object()
+_LIST = object()
+_END = object()
+
+
+def _freeze(
+    value: Any,
+    field_set: Optional[dict] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+) -> Hashable:
+    """
+    Hashable copy of a value: the flat tuple of the tokens of its walk,
+    the items of its mappings being sorted by key.
+
+    The tuple is flat so that hashing and comparing it do not recurse, however nested the value.
+    The nested values are walked with an explicit work stack instead of recursive calls,
+    like the decoder walks them, and the walk stops as soon as one of the limits is exceeded.
+
+    :param field_set: only keep the fields of this field set AST (all the fields if None)
+    :param max_depth: max nesting depth of the mappings of the value
+    :param max_nodes: max number of mappings in the value
+    """
+    tokens: list[Any] = []
+    nodes = 0
+    # (value, field set, depth) of the values to walk, and (token, None, None) of the tokens to add
+    stack: list[tuple[Any, Optional[dict], Optional[int]]] = [(value, field_set, 1)]
+    while stack:
+        value, field_set, depth = stack.pop()
+        if depth is None:
+            tokens.append(value)
+        elif isinstance(value, dict) or isinstance(value, Mapping):
+            if max_depth is not None and depth > max_depth:
+                raise RepresentationLimitError(
+                    f"Representation exceeds the max nesting depth of {max_depth}"
+                )
+            nodes += 1
+            if max_nodes is not None and nodes > max_nodes:
+                raise RepresentationLimitError(
+                    f"Representations exceed the max number of {max_nodes} objects"
+                )
+            if not field_set or "__union__" in field_set:
+                # Leaf or union field, frozen entirely
+                field_sets: dict = dict.fromkeys(value)
+            else:
+                field_sets = {key: field_set[key] for key in value if key in field_set}
+            tokens.append(_MAPPING)
+            stack.append((_END, None, None))
+            for key in sorted(field_sets, reverse=True):
+                stack.append((value[key], field_sets[key], depth + 1))
+                stack.append((key, None, None))
+        elif isinstance(value, (list, tuple)):
+            tokens.append(_LIST)
+            stack.append((_END, None, None))
+            stack.extend((item, field_set, depth) for item in reversed(value))
+        else:
+            tokens.append(value)
+    return tuple(tokens)
+
+
+def get_representation_key(
+    representation: Mapping[str, Any],
+    field_set: Optional[dict] = None,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+) -> Hashable:
+    """
+    Canonical hashable key of a representation.
+
+    :param representation: representation sent by the router
+    :param field_set: only use the fields of this field set AST,
+        e.g. the fields decoded from the representation (all fields if None)
+    :param max_depth: max nesting depth of the objects of the representation
+    :param max_nodes: max number of objects in the representation
+    """
+    return _freeze(
+        {
+            field: value
+            for field, value in representation.items()
+            if field != "__typename"
+        },
+        field_set,
+        max_depth,
+        max_nodes,
+    )
+
+
+def get_request_state(context: Any) -> Optional[dict]:
+    """
+    Get the per request state of the entity resolution, stored on the request context.
+
+    Returns None if the context cannot hold it.
+    """
+    if context is None:
+        return None
+    if isinstance(context, dict):
+        return context.setdefault(REQUEST_STATE_KEY, {})
+
+    state = getattr(context, REQUEST_STATE_KEY, None)
+    if state is None:
+        state = {}
+        try:
+            setattr(context, REQUEST_STATE_KEY, state)
+        except AttributeError:
+            return None
+    return state
+
+
+def _check_resolved(
+    entity: EntityDescriptor, instances: list[ObjectType], resolved: Iterable[Any]
+) -> list[Any]:
+    resolved = list(resolved)
+    if len(resolved) != len(instances):
+        raise ValueError(
+            f"{entity.model.__name__}.resolve_references returned {len(resolved)} "
+            f"entities for {len(instances)} representations"
+        )
+    return resolved
+
+
+def resolve_reference_types(
+    entity: EntityDescriptor, representations: list[Mapping[str, Any]], info
+) -> list[str | Exception]:
+    """
+    Get the concrete entity type names of the representations of an interface entity
+    with its `__resolve_reference_types` hook, in a single call.
+
+    A type which is not an entity implementing the interface is replaced by an error.
+    """
+    if entity.type_resolver is None:
+        raise GraphQLError(
+            f"Interface entity {entity.type_name!r} has no "
+            "__resolve_reference_types to resolve the type of its representations"
+        )
+
+    resolved = list(entity.type_resolver(representations, info))
+    if len(resolved) != len(representations):
+        raise ValueError(
+            f"{entity.model.__name__}.resolve_reference_types returned {len(resolved)} "
+            f"types for {len(representations)} representations"
+        )
+
+    type_names = []
+    for concrete_type in resolved:
+        type_name = (
+            concrete_type
+            if isinstance(concrete_type, str)
+            else getattr(getattr(concrete_type, "_meta", None), "name", None)
+        )
+        if type_name not in entity.implementations:
+            type_name = GraphQLError(
+                f"Type {type_name!r} is not an entity implementing "
+                f"the interface {entity.type_name!r}"
+            )
+        type_names.append(type_name)
+    return type_names
+
+
+def resolve_references(
+    entity: EntityDescriptor, instances: list[ObjectType], info
+) -> list[Any] | Awaitable[list[Any]]:
+    """
+    Resolve the instances of one entity type with its batch or per-instance resolver.
+
+    An async batch resolver makes this return an awaitable of the resolved list,
+    an async per-instance resolver puts one awaitable per instance in the list.
+    The exception raised by a per-instance resolver is put in place of its entity.
+    """
+    batch_resolver = entity.batch_resolver
+    if batch_resolver:
+        resolved = batch_resolver(instances, info)
+        if isawaitable(resolved):
+
+            async def await_resolved():
+                return _check_resolved(entity, instances, await resolved)
+
+            return await_resolved()
+        return _check_resolved(entity, instances, resolved)
+
+    resolver = entity.resolver
+    if resolver:
+        resolved = []
+        for instance in instances:
+            try:
+                resolved.append(resolver(instance, info))
+            except Exception as error:
+                resolved.append(error)
+        return resolved
+
+    return instances
+
+
+def submit_references(
+    executor: Executor, entity: EntityDescriptor, instances: list[ObjectType], info
+) -> tuple[list[Future], bool]:
+    """
+    Submit the reference resolution of the instances of one entity type to the executor.
+
+    A batch resolver is submitted as a single task, a per-instance resolver as one task per instance.
+    Returns the futures and whether the first one holds the whole batch.
+    """
+    resolver = entity.resolver
+    if resolver is None or entity.batch_resolver:
+        return [executor.submit(resolve_references, entity, instances, info)], True
+    return [executor.submit(resolver, instance, info) for instance in instances], False
+
+
+def _has_running_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _check_running_loop(awaitables: Iterable[Any] = ()) -> None:
+    """
+    Raise an error if no event loop is running (e.g. with graphql_sync) to await
+    the async resolution of the entities, closing the coroutines nothing would await.
+    """
+    if _has_running_loop():
+        return
+    for awaitable in awaitables:
+        if iscoroutine(awaitable):
+            awaitable.close()
+    raise GraphQLError(
+        "Resolving entities asynchronously (with async reference resolvers "
+        "or entity_dataloader) requires async execution"
+    )
+
+
+async def _await_value(value: Any) -> Any:
+    return await value if isawaitable(value) else value
+
+
+async def _get_item(awaitable: Awaitable[list[Any]], index: int) -> Any:
+    return (await awaitable)[index]
+
+
+def get_entity_loader(
+    entity: EntityDescriptor, info, executor: Optional[Executor] = None
+) -> DataLoader:
+    """
+    Get the DataLoader of the entity type (or of one of its keys) for the current request.
+
+    The loader is loaded with (representation key, instance) pairs, the key covering
+    all the decoded fields (`@key` and `@requires`), so that the instances sharing
+    the same key are resolved only once.
+    The batches are resolved on the executor, if given.
+    """
+    state = get_request_state(info.context)
+    loaders = state.setdefault("loaders", {}) if state is not None else {}
+    loader = loaders.get(entity)
+    if loader is None:
+
+        async def batch_load(keys: list[tuple[Hashable, ObjectType]]) -> list[Any]:
+            instances = [instance for _, instance in keys]
+            if executor is not None:
+                resolved = await asyncio.get_running_loop().run_in_executor(
+                    executor, resolve_references, entity, instances, info
+                )
+            else:
+                resolved = resolve_references(entity, instances, info)
+            if not isinstance(resolved, list):
+                # Awaitable of an async batch resolver
+                return await resolved
+            return await asyncio.gather(
+                *(_await_value(value) for value in resolved), return_exceptions=True
+            )
+
+        loader = loaders[entity] = DataLoader(batch_load, get_cache_key=itemgetter(0))
+    return loader
+
+
+async def gather_references(
+    entities: list[Any],
+    pending: list[tuple[list[list[int]], Awaitable, bool]],
+    concurrency_limit: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> list[Any]:
+    """
+    Await the pending reference resolvers concurrently and put their results
+    (or the exception they raised) at the positions of their representations.
+
+    :param entities: the entities resolved so far
+    :param pending: (positions, awaitable, is_batch) for each pending resolver,
+        positions holding the indexes sharing each resolved entity
+    :param concurrency_limit: max number of resolvers awaited at the same time
+    :param deadline: time.monotonic() value after which the resolvers still running are cancelled,
+        their entities getting an EntityTimeoutError
+    """
+    semaphore = asyncio.Semaphore(concurrency_limit) if concurrency_limit else None
+
+    async def run(awaitable: Awaitable) -> Any:
+        if semaphore is None:
+            result = await awaitable
+        else:
+            async with semaphore:
+                result = await awaitable
+        # An executor future can hold the awaitable returned by an async resolver
+        return await result if isawaitable(result) else result
+
+    tasks = [asyncio.ensure_future(run(awaitable)) for _, awaitable, _ in pending]
+    await asyncio.wait(
+        tasks,
+        timeout=max(deadline - time.monotonic(), 0) if deadline is not None else None,
+    )
+
+    results = []
+    for task, (_, awaitable, _) in zip(tasks, pending):
+        if task.done():
+            results.append(task.exception() or task.result())
+            continue
+        task.cancel()
+        if iscoroutine(awaitable) and getcoroutinestate(awaitable) == CORO_CREATED:
+            # Never started (e.g. waiting for the semaphore)
+            awaitable.close()
+        results.append(EntityTimeoutError())
+
+    for (positions, _, is_batch), result in zip(pending, results):
+        if isinstance(result, BaseException):
+            # The failed resolver only fails its own entities
+            instances = [result] * len(positions)
+        else:
+            instances = result if is_batch else [result]
+        for indexes, instance in zip(positions, instances):
+            for index in indexes:
+                entities[index] = instance
+    return entities
+
+
+def get_entity_cache(cache: bool | EntityCache, info) -> Optional[EntityCache]:
+    """
+    Get the entity cache to use for the current request.
+
+    :param cache: a cache shared across the requests, or True for a cache per request
+    """
+    if isinstance(cache, EntityCache):
+        return cache
+    if not cache:
+        return None
+    state = get_request_state(info.context)
+    if state is None:
+        return None
+    return state.setdefault("cache", EntityCache())
+
+
+async def _cache_resolved(
+    cache: EntityCache, keys: list[Hashable], awaitable: Awaitable, is_batch: bool
+) -> Any:
+    result = await awaitable
+    for key, instance in zip(keys, result if is_batch else [result]):
+        if not isinstance(instance, Exception):
+            cache.set(key, instance)
+    return result
+
+
+class EntityResolver:
+    """
+    Resolver of the `_entities` calls of a schema, from its table of entity descriptors
+    and the options given to `build_schema`.
+    """
+
+    def __init__(
+        self,
+        schema: Schema,
+        descriptors: Mapping[str, EntityDescriptor],
+        concurrency_limit: Optional[int] = None,
+        dataloader: bool = False,
+        deduplication: bool = True,
+        cache: bool | EntityCache = False,
+        executor: Optional[Executor] = None,
+        max_representations: Optional[int] = None,
+        max_depth: Optional[int] = None,
+        max_nodes: Optional[int] = None,
+        timeout: Optional[float] = None,
+        chunk_size: Optional[int] = None,
+    ):
+        """
+        :param schema: schema of the entities
+        :param descriptors: entity descriptors, per type name
+        :param concurrency_limit: max number of async reference resolvers awaited at the same time
+        :param dataloader: resolve the references through a per request DataLoader of each entity type
+        :param deduplication: resolve the representations sharing the same key only once per call
+        :param cache: EntityCache shared across the requests, or True for a cache per request
+        :param executor: executor (e.g. a bounded ThreadPoolExecutor) running the blocking reference resolvers
+        :param max_representations: max number of representations per call
+        :param max_depth: max nesting depth of the objects of a representation
+        :param max_nodes: max number of objects decoded per call, over all the representations
+        :param timeout: number of seconds after which the resolution of the entities of a call is stopped
+        :param chunk_size: resolve the representations of a call by chunks of this size,
+            produced one after the other while the result is serialized
+        """
+        self.schema = schema
+        self.descriptors = descriptors
+        self.concurrency_limit = concurrency_limit
+        self.dataloader = dataloader
+        self.deduplication = deduplication
+        self.cache = cache
+        self.executor = executor
+        self.max_representations = max_representations
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.interfaces = frozenset(
+            type_name
+            for type_name, descriptor in descriptors.items()
+            if issubclass(descriptor.model, Interface)
+        )
+
+    def get_descriptor(self, type_name: Optional[str]) -> EntityDescriptor:
+        """
+        Get the descriptor of the type of a representation,
+        raising the error reported for the representation if it is not an entity.
+        """
+        if type_name is None:
+            raise GraphQLError("Representation is missing its __typename")
+        descriptor = self.descriptors.get(type_name)
+        if descriptor is not None:
+            return descriptor
+        if self.schema.graphql_schema.get_type(type_name) is None:
+            raise GraphQLError(f"Unknown type in representation: {type_name!r}")
+        raise GraphQLError(f"Type {type_name!r} of representation is not an entity")
+
+    def resolve_entities(self, info, representations: list[Mapping[str, Any]]) -> Any:
+        """
+        Resolve the entities of the representations.
+
+        A failure only fails the entities concerned: their position holds the exception,
+        which is reported as a located error next to the other entities.
+        The limits on the representations are checked before any reference resolver
+        or `__resolve_reference_types` hook runs (of the chunk, with a chunk size),
+        exceeding them fails the whole call.
+        With a chunk size, the entities are produced by an iterator resolving them chunk by chunk.
+        Past the timeout, no more resolvers are called and the async ones are cancelled,
+        the entities not resolved yet getting an EntityTimeoutError.
+        """
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+
+        max_representations = self.max_representations
+        if max_representations is not None and (
+            len(representations) > max_representations
+        ):
+            raise RepresentationLimitError(
+                f"Too many representations: {len(representations)} "
+                f"(max {max_representations})"
+            )
+
+        chunk_size = self.chunk_size
+        if chunk_size is not None and len(representations) > chunk_size:
+            return self.iter_entities(info, representations, deadline, chunk_size)
+
+        return EntityResolution(self, info, representations, deadline).resolve()[0]
+
+    def iter_entities(
+        self,
+        info,
+        representations: list[Mapping[str, Any]],
+        deadline: Optional[float],
+        chunk_size: int,
+    ) -> Iterator[Any]:
+        """
+        Resolve the entities chunk by chunk, each chunk being resolved
+        (with its own calls to the batch resolvers) only once the previous one is consumed.
+        """
+        decoded_nodes = 0
+        for start in range(0, len(representations), chunk_size):
+            chunk = representations[start : start + chunk_size]
+            entities, decoded_nodes = EntityResolution(
+                self, info, chunk, deadline, decoded_nodes
+            ).resolve()
+            if isinstance(entities, list):
+                yield from entities
+            else:
+                future = asyncio.ensure_future(entities)
+                yield from (_get_item(future, index) for index in range(len(chunk)))
+
+
+class EntityResolution:
+    """
+    Resolution of the representations of an `_entities` call (or of one of its chunks),
+    in the order of the representations.
+
+    The representations are bucketed per __typename, so that the type lookups run once per type
+    and the batch resolvers get all their instances at once. Each bucket is keyed, deduplicated,
+    looked up in the cache and decoded, and the references are only resolved
+    once all the representations are decoded.
+    """
+
+    def __init__(
+        self,
+        resolver: EntityResolver,
+        info,
+        representations: list[Mapping[str, Any]],
+        deadline: Optional[float],
+        decoded_nodes: int = 0,
+    ):
+        """
+        :param resolver: resolver of the `_entities` calls of the schema
+        :param info: info of the `_entities` field
+        :param representations: representations to resolve
+        :param deadline: time.monotonic() value after which the resolution is stopped
+        :param decoded_nodes: number of objects already decoded in the call
+        """
+        self.resolver = resolver
+        self.info = info
+        self.representations = representations
+        self.deadline = deadline
+        self.decoded_nodes = decoded_nodes
+        self.cache = get_entity_cache(resolver.cache, info)
+        self.use_keys = (
+            resolver.deduplication or resolver.dataloader or self.cache is not None
+        )
+        self.entities: list[Any] = [None] * len(representations)
+        # (positions, awaitable, is_batch) of the resolvers to await
+        self.pending: list[tuple[list[list[int]], Awaitable, bool]] = []
+        # (positions, keys, (futures, is_batch)) of the resolvers run on the executor
+        self.submitted: list[
+            tuple[list[list[int]], list, tuple[list[Future], bool]]
+        ] = []
+
+    def resolve(self) -> tuple[list[Any] | Awaitable[list[Any]], int]:
+        """
+        :return: the entities (or an awaitable of them) and the number of objects decoded in the call
+        """
+        batches: list[tuple[EntityDescriptor, list, list, list]] = []
+        for type_name, indexes in self.get_buckets().items():
+            try:
+                entity = self.resolver.get_descriptor(type_name)
+                positions, keys = self.deduplicate(entity, indexes)
+            except RepresentationLimitError:
+                raise
+            except Exception as error:
+                self.fail([indexes], error)
+                continue
+            batches.extend(self.decode(entity, positions, keys))
+
+        for entity, positions, keys, instances in batches:
+            self.dispatch(entity, positions, keys, instances)
+        self.collect_submitted()
+
+        if self.pending:
+            return (
+                gather_references(
+                    self.entities,
+                    self.pending,
+                    self.resolver.concurrency_limit,
+                    self.deadline,
+                ),
+                self.decoded_nodes,
+            )
+        return self.entities, self.decoded_nodes
+
+    def fail(self, positions: Iterable[list[int]], error: Exception) -> None:
+        for position in positions:
+            for index in position:
+                self.entities[index] = error
+
+    def assign(self, positions: list[list[int]], keys: list, instances: Any) -> None:
+        """
+        Put the resolved instances at their positions, caching them.
+        The awaitable ones are kept pending.
+        """
+        cache = self.cache
+        if isawaitable(instances):
+            _check_running_loop([instances])
+            if cache is not None:
+                instances = _cache_resolved(cache, keys, instances, True)
+            self.pending.append((positions, instances, True))
+            return
+
+        for position, key, instance in zip(positions, keys, instances):
+            if isawaitable(instance):
+                _check_running_loop(filter(isawaitable, instances))
+                if cache is not None:
+                    instance = _cache_resolved(cache, [key], instance, False)
+                self.pending.append(([position], instance, False))
+            elif cache is not None and not isinstance(instance, Exception):
+                cache.set(key, instance)
+            for index in position:
+                self.entities[index] = instance
+
+    def get_buckets(self) -> Dict[Optional[str], list[int]]:
+        """
+        Get the indexes of the representations per __typename,
+        the representations of the interface entities being in the buckets of their concrete types.
+        """
+        buckets: Dict[Optional[str], list[int]] = {}
+        for index, representation in enumerate(self.representations):
+            if not isinstance(representation, Mapping):
+                self.entities[index] = GraphQLError("Representation must be an object")
+                continue
+            buckets.setdefault(representation.get("__typename"), []).append(index)
+
+        # The concrete types are resolved once per interface
+        interfaces = self.resolver.interfaces
+        for interface_name in [name for name in buckets if name in interfaces]:
+            indexes = buckets.pop(interface_name)
+            interface = self.resolver.descriptors[interface_name]
+            representations = [self.representations[index] for index in indexes]
+            # The limits are checked before the hook resolving the concrete types runs
+            self.check_limits(interface, representations)
+            try:
+                type_names = resolve_reference_types(
+                    interface, representations, self.info
+                )
+            except Exception as error:
+                self.fail([indexes], error)
+                continue
+            for index, type_name in zip(indexes, type_names):
+                if isinstance(type_name, Exception):
+                    self.entities[index] = type_name
+                else:
+                    buckets.setdefault(type_name, []).append(index)
+        return buckets
+
+    def check_limits(
+        self, entity: EntityDescriptor, representations: list[Mapping[str, Any]]
+    ) -> None:
+        """
+        Check the limits on the representations of an entity without decoding them,
+        the objects being counted again when they are decoded.
+        """
+        max_depth, max_nodes = self.resolver.max_depth, self.resolver.max_nodes
+        if max_depth is None and max_nodes is None:
+            return
+
+        checked_nodes = self.decoded_nodes
+        for representation in representations:
+            try:
+                _, nodes = entity.decoder.collect(
+                    representation, max_depth, max_nodes, checked_nodes
+                )
+            except RepresentationLimitError:
+                raise
+            except Exception:
+                # Failed on its own once decoded
+                continue
+            checked_nodes += len(nodes)
+
+    def deduplicate(
+        self, entity: EntityDescriptor, indexes: list[int]
+    ) -> tuple[list[list[int]], list]:
+        """
+        Group the indexes of the representations sharing the same entity, with their key,
+        and set the cached entities.
+
+        :return: the positions (indexes sharing each entity) and keys of the entities to resolve
+        """
+        keys: list[Optional[Hashable]]
+        if self.use_keys:
+            keys = [
+                (
+                    entity.type_name,
+                    get_representation_key(
+                        self.representations[index],
+                        entity.field_set,
+                        self.resolver.max_depth,
+                        self.resolver.max_nodes,
+                    ),
+                )
+                for index in indexes
+            ]
+        else:
+            keys = [None] * len(indexes)
+
+        if self.resolver.deduplication:
+            unique_positions: Dict[Hashable, list[int]] = {}
+            for index, key in zip(indexes, keys):
+                unique_positions.setdefault(key, []).append(index)
+            positions = list(unique_positions.values())
+            keys = list(unique_positions)
+        else:
+            positions = [[index] for index in indexes]
+
+        cache = self.cache
+        if cache is None:
+            return positions, keys
+
+        missed_positions, missed_keys = [], []
+        for position, key in zip(positions, keys):
+            instance = cache.get(key, _MISSING)
+            if instance is _MISSING:
+                missed_positions.append(position)
+                missed_keys.append(key)
+                continue
+            for index in position:
+                self.entities[index] = instance
+        return missed_positions, missed_keys
+
+    def decode(
+        self, entity: EntityDescriptor, positions: list[list[int]], keys: list
+    ) -> list[tuple[EntityDescriptor, list, list, list]]:
+        """
+        Decode the instances of an entity type.
+
+        :return: the (descriptor, positions, keys, instances) batches, per descriptor of their key
+        """
+        decoder = entity.decoder
+        routed: Dict[EntityDescriptor, tuple[list, list, list]] = {}
+        for position, key in zip(positions, keys):
+            representation = self.representations[position[0]]
+            try:
+                root, nodes = decoder.collect(
+                    representation,
+                    self.resolver.max_depth,
+                    self.resolver.max_nodes,
+                    self.decoded_nodes,
+                )
+                instance = decoder.build(root, nodes)
+            except RepresentationLimitError:
+                raise
+            except Exception as error:
+                self.fail([position], error)
+                continue
+            self.decoded_nodes += len(nodes)
+            batch = routed.setdefault(entity.route(representation), ([], [], []))
+            batch[0].append(position)
+            batch[1].append(key)
+            batch[2].append(instance)
+        return [(key_entity, *batch) for key_entity, batch in routed.items()]
+
+    def dispatch(
+        self,
+        entity: EntityDescriptor,
+        positions: list[list[int]],
+        keys: list,
+        instances: list[ObjectType],
+    ) -> None:
+        """
+        Resolve the references of a batch through the dataloader, the executor or directly.
+        """
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.fail(positions, EntityTimeoutError())
+            return
+
+        info = self.info
+        executor = self.resolver.executor
+        if self.resolver.dataloader:
+            _check_running_loop()
+            loader = get_entity_loader(entity, info, executor)
+            for position, key, instance in zip(positions, keys, instances):
+                loaded = loader.load((key, instance))
+                if self.cache is not None:
+                    loaded = _cache_resolved(self.cache, [key], loaded, False)
+                self.pending.append(([position], loaded, False))
+            return
+
+        if executor is not None and instances:
+            self.submitted.append(
+                (positions, keys, submit_references(executor, entity, instances, info))
+            )
+            return
+
+        try:
+            resolved = resolve_references(entity, instances, info)
+        except Exception as error:
+            self.fail(positions, error)
+            return
+        self.assign(positions, keys, resolved)
+
+    def collect_submitted(self) -> None:
+        """
+        Get the results of the resolvers run on the executor, waiting for them
+        unless an event loop is running, in which case they are awaited with the others.
+        """
+        if _has_running_loop():
+            for positions, keys, (futures, is_batch) in self.submitted:
+                if is_batch:
+                    self.assign(positions, keys, asyncio.wrap_future(futures[0]))
+                else:
+                    self.assign(positions, keys, map(asyncio.wrap_future, futures))
+            return
+
+        for positions, keys, (futures, is_batch) in self.submitted:
+            if is_batch:
+                try:
+                    self.assign(positions, keys, self.get_result(futures[0]))
+                except Exception as error:
+                    self.fail(positions, error)
+                continue
+
+            resolved = []
+            for future in futures:
+                try:
+                    resolved.append(self.get_result(future))
+                except Exception as error:
+                    resolved.append(error)
+            self.assign(positions, keys, resolved)
+
+    def get_result(self, future: Future) -> Any:
+        deadline = self.deadline
+        try:
+            return future.result(
+                max(deadline - time.monotonic(), 0) if deadline is not None else None
+            )
+        except FutureTimeoutError:
+            future.cancel()
+            raise EntityTimeoutError()
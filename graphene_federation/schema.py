@@ -1,8 +1,11 @@
+from concurrent.futures import Executor
+from os import PathLike
 from typing import Collection, Type, Union
 from typing import Optional
 
 from graphene import ObjectType, PageInfo
 from graphene_directives import (
+    DirectiveValidationError,
     SchemaDirective,
     build_schema as build_directive_schema,
     directive_decorator,
@@ -16,6 +19,7 @@ from .apollo_versions import (
     get_directives_based_on_version,
 )
 from .apollo_versions.v2_1 import compose_directive as ComposeDirective
+from .cache import EntityCache
 from .composable_directive import ComposableDirective
 from .entity import get_entity_query
 from .schema_directives import compose_directive, link_directive
@@ -23,14 +27,23 @@ from .service import get_service_query
 
 
 def _get_federation_query(
-    schema: Schema, query_cls: Optional[ObjectType] = None
+    schema: Schema,
+    query_cls: Optional[ObjectType] = None,
+    sdl_hash: bool = False,
+    sdl_lazy: bool = False,
+    sdl_cache_path: Optional[Union[str, PathLike]] = None,
+    **entity_query_kwargs,
 ) -> Type[ObjectType]:
     """
     Add Federation required _service and _entities to Query(ObjectType)
     """
     type_name = "Query"
-    bases = [get_service_query(schema)]
-    entity_cls = get_entity_query(schema)
+    bases = [
+        get_service_query(
+            schema, sdl_hash=sdl_hash, lazy=sdl_lazy, cache_path=sdl_cache_path
+        )
+    ]
+    entity_cls = get_entity_query(schema, **entity_query_kwargs)
     if entity_cls:
         bases.append(entity_cls)
     if query_cls is not None:
@@ -40,6 +53,21 @@ def _get_federation_query(
     return federated_query_cls  # noqa
 
 
+def _validate_schema_directives(schema_directives: Collection[SchemaDirective]):
+    """
+    Check that the directives which are not repeatable are used once on the schema
+    (as done by graphene_directives.build_schema).
+    """
+    used: set[str] = set()
+    for schema_directive in schema_directives:
+        name = schema_directive.target_directive.name
+        if name in used and not schema_directive.target_directive.is_repeatable:
+            raise DirectiveValidationError(
+                f"{schema_directive.target_directive} is not repeatable on schema"
+            )
+        used.add(name)
+
+
 def _add_sharable_to_page_info_type(
     schema: Schema,
     federation_version: FederationVersion,
@@ -73,6 +101,19 @@ def build_schema(
     schema_directives: Collection[SchemaDirective] = None,
     auto_camelcase: bool = True,
     federation_version: FederationVersion = None,
+    entity_concurrency_limit: Optional[int] = None,
+    entity_dataloader: bool = False,
+    entity_deduplication: bool = True,
+    entity_cache: Union[bool, EntityCache] = False,
+    entity_executor: Optional[Executor] = None,
+    entity_max_representations: Optional[int] = None,
+    entity_max_depth: Optional[int] = None,
+    entity_max_nodes: Optional[int] = None,
+    entity_timeout: Optional[float] = None,
+    entity_chunk_size: Optional[int] = None,
+    service_sdl_hash: bool = False,
+    service_sdl_lazy: bool = False,
+    service_sdl_cache: Optional[Union[str, PathLike]] = None,
 ) -> Schema:
     """
     Build Schema.
@@ -95,6 +136,36 @@ def build_schema(
         include_graphql_spec_directives (bool): Includes directives defined by GraphQL spec (@include, @skip,
             @deprecated, @specifiedBy)
         federation_version (FederationVersion): Specify the version explicit (default STABLE_VERSION)
+        entity_concurrency_limit (Optional[int]): Max number of async reference resolvers awaited
+            at the same time in one `_entities` call. Default unlimited.
+        entity_dataloader (bool): Resolve the entity references through a DataLoader per entity type
+            and per request, keyed on the `@key` and `@requires` fields. Requires async execution.
+            Default False.
+        entity_deduplication (bool): Resolve the representations of an `_entities` call sharing the same
+            `@key` and `@requires` fields only once. Disable it for reference resolvers that are
+            not idempotent. Default True.
+        entity_cache (Union[bool, EntityCache]): Cache of the resolved entities consulted before calling the
+            reference resolvers. True for a new cache per request, or an EntityCache shared across requests.
+            Default False.
+        entity_executor (Optional[Executor]): Executor, e.g. a bounded ThreadPoolExecutor, on which the blocking
+            reference resolvers of an `_entities` call are run concurrently. Default None (run in the caller).
+        entity_max_representations (Optional[int]): Max number of representations per `_entities` call.
+            Default unlimited.
+        entity_max_depth (Optional[int]): Max nesting depth of the objects of a representation. Default unlimited.
+        entity_max_nodes (Optional[int]): Max number of objects decoded per `_entities` call, over all its
+            representations. Default unlimited.
+        entity_timeout (Optional[float]): Number of seconds after which the resolution of the entities
+            of an `_entities` call is stopped, the async reference resolvers still running being cancelled.
+            The entities not resolved by then are null, with an error. Default unlimited.
+        entity_chunk_size (Optional[int]): Resolve the representations of an `_entities` call by chunks
+            of this size, each chunk being resolved (with its own batch resolver calls) while the previous
+            ones are serialized, so that the resolved entities are not all held at once. Default None.
+        service_sdl_hash (bool): Add the `sdlHash` field, the SHA-256 digest of the SDL, to `_Service`.
+            The digest is available as `schema.service_sdl.hash` either way. Default False.
+        service_sdl_lazy (bool): Print the SDL on the first `_service` request (or first use of
+            `schema.service_sdl`) instead of when building the schema. Default False.
+        service_sdl_cache (Optional[Union[str, PathLike]]): File caching the printed SDL across processes,
+            reused as long as the fingerprint of the type definitions it was written for matches. Default None.
     """
 
     federation_version = federation_version if federation_version else STABLE_VERSION
@@ -189,15 +260,36 @@ def build_schema(
     if schema_directives:
         _schema_directives.extend(list(schema_directives))
 
-    schema_args["schema_directives"] = (
-        _schema_directives if federation_2_enabled else []
-    )
+    if not federation_2_enabled:
+        _schema_directives = []
+    schema_args["schema_directives"] = _schema_directives
 
-    # Call it again to rebuild the schema using the schema directives
-    schema = build_directive_schema(query=query, **schema_args)
+    # The schema directives are only used to print the schema:
+    # set them on the schema built above instead of building it again
+    _validate_schema_directives(_schema_directives)
+    schema.schema_directives = _schema_directives
 
     # Add Federation required _service and _entities to Query
-    return build_directive_schema(
-        query=_get_federation_query(schema, schema.query),
-        **schema_args,
+    federation_query = _get_federation_query(
+        schema,
+        schema.query,
+        sdl_hash=service_sdl_hash,
+        sdl_lazy=service_sdl_lazy,
+        sdl_cache_path=service_sdl_cache,
+        concurrency_limit=entity_concurrency_limit,
+        dataloader=entity_dataloader,
+        deduplication=entity_deduplication,
+        cache=entity_cache,
+        executor=entity_executor,
+        max_representations=entity_max_representations,
+        max_depth=entity_max_depth,
+        max_nodes=entity_max_nodes,
+        timeout=entity_timeout,
+        chunk_size=entity_chunk_size,
     )
+    schema = build_directive_schema(query=federation_query, **schema_args)
+
+    decoders = getattr(federation_query, "representation_decoders", None)
+    schema.entity_field_names = decoders.field_names if decoders else {}
+    schema.service_sdl = federation_query.service_sdl
+    return schema
@@ -1,5 +1,103 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+from functools import cached_property, partial
+from importlib.metadata import PackageNotFoundError, version
+from typing import Any, Callable, Iterator, Optional
+
 from graphene import Field, ObjectType, String
 from graphene_directives.schema import Schema
+from graphql import print_schema
+
+
+def _get_version(distribution: str) -> str:
+    try:
+        return version(distribution)
+    except PackageNotFoundError:  # pragma: no cover
+        return ""
+
+
+# Versions of the packages printing the SDL
+_PRINTER_VERSIONS = " ".join(
+    _get_version(distribution)
+    for distribution in ("graphene-directives", "graphene-federation")
+)
+
+# Query sent by the routers to fetch the SDL of a subgraph, in its normalized form
+SDL_QUERY = "{ _service { sdl } }"
+
+_COMMENT = re.compile(r"#[^\n\r]*")
+_NOT_A_TOKEN = re.compile(r"[^\s\w{}]")
+_TOKEN = re.compile(r"\w+|[{}]")
+
+
+def get_query_hash(query: str) -> Optional[str]:
+    """
+    Hash of a query made only of names and selection sets, once normalized
+    (without comments, operation type nor operation name, and with single spaces).
+
+    Returns None for the other queries (arguments, aliases, fragments, variables...).
+    """
+    query = _COMMENT.sub("", query)
+    if _NOT_A_TOKEN.search(query):
+        return None
+
+    tokens = _TOKEN.findall(query)
+    if tokens[:1] == ["query"]:
+        # Anonymous or named query operation
+        del tokens[: 1 if tokens[1:2] == ["{"] else 2]
+    return hashlib.sha256(" ".join(tokens).encode()).hexdigest()
+
+
+SDL_QUERY_HASH = get_query_hash(SDL_QUERY)
+
+
+class ServiceSDL:
+    """
+    SDL of a subgraph, with the serialized response of the router `{ _service { sdl } }` query
+    and the digest of the SDL.
+
+    They are computed once, on first access: the SDL is printed when the schema is built,
+    unless it is printed lazily.
+    """
+
+    def __init__(self, printer: Callable[[], str]):
+        """
+        :param printer: function printing the SDL
+        """
+        self._printer: Optional[Callable[[], str]] = printer
+        self._sdl: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @cached_property
+    def sdl(self) -> str:
+        # cached_property does not lock since Python 3.12:
+        # the threads reading the SDL first wait for a single print
+        with self._lock:
+            if self._sdl is None:
+                assert self._printer is not None
+                self._sdl = self._printer()
+                self._printer = None  # Release the schema it prints
+            return self._sdl
+
+    @cached_property
+    def hash(self) -> str:
+        # Stable across builds and processes, to tell if the SDL has changed
+        return hashlib.sha256(self.sdl.encode()).hexdigest()
+
+    @cached_property
+    def etag(self) -> str:
+        return f'"{self.hash}"'
+
+    @cached_property
+    def response(self) -> bytes:
+        return json.dumps(
+            {"data": {"_service": {"sdl": self.sdl}}}, separators=(",", ":")
+        ).encode()
 
 
 def get_sdl(schema) -> str:
@@ -11,22 +109,151 @@ def get_sdl(schema) -> str:
     return string_schema.strip()
 
 
-def get_service_query(schema: Schema):
+def _get_directive_owners(graphene_type: Any) -> Iterator[tuple[str, Any]]:
+    """
+    Objects of a graphene type the directives can be set on, with their names:
+    the type, its fields (or input fields), the arguments of its fields and its enum values.
+    """
+    yield "", graphene_type
+    yield from sorted(vars(graphene_type).items(), key=lambda item: str(item[0]))
+
+    meta = getattr(graphene_type, "_meta", None)
+    fields = getattr(meta, "fields", None) or {}
+    for field_name, field in sorted(fields.items()):
+        arguments = getattr(field, "args", None) or {}
+        for argument_name, argument in sorted(arguments.items()):
+            yield f"{field_name}({argument_name})", argument
+
+    enum = getattr(meta, "enum", None)
+    if enum is not None:
+        for value_name, value in enum.__members__.items():
+            yield value_name, value
+
+
+def get_schema_fingerprint(schema: Schema) -> str:
+    """
+    Digest of the type definitions of a schema and of the directives applied to them,
+    computed without printing the SDL.
+    """
+    digest = hashlib.sha256(print_schema(schema.graphql_schema).encode())
+    digest.update(_PRINTER_VERSIONS.encode())
+    for schema_directive in schema.schema_directives:
+        digest.update(
+            repr(
+                (str(schema_directive.target_directive), schema_directive.arguments)
+            ).encode()
+        )
+
+    # The directives are set as attributes of the graphene types, of their fields,
+    # of the arguments of their fields and of their enum values
+    for type_name, type_ in sorted(schema.graphql_schema.type_map.items()):
+        graphene_type = getattr(type_, "graphene_type", None)
+        if graphene_type is None:
+            continue
+        for owner_name, owner in _get_directive_owners(graphene_type):
+            attributes = getattr(owner, "__dict__", {})
+            values = sorted(
+                (name, value)
+                for name, value in attributes.items()
+                if name.startswith("_directive_")
+            )
+            if values:
+                digest.update(repr((type_name, owner_name, values)).encode())
+    return digest.hexdigest()
+
+
+def get_cached_sdl(schema: Schema, path: str | os.PathLike) -> str:
+    """
+    Get the SDL of a schema from a cache file, printing and caching it
+    if the file is missing or was written for other type definitions.
+
+    The file holds the fingerprint of the schema on its first line, followed by the SDL.
+    Failing to write it (e.g. on a read only file system) only disables the cache.
+    """
+    fingerprint = get_schema_fingerprint(schema)
+    try:
+        with open(path, encoding="utf-8") as cache_file:
+            if cache_file.readline().rstrip("\n") == fingerprint:
+                return cache_file.read()
+    except OSError:
+        pass
+
+    sdl = get_sdl(schema)
+    try:
+        # Written aside first, so that the other workers never read a partial file
+        temp_path = f"{os.fspath(path)}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as cache_file:
+            cache_file.write(f"{fingerprint}\n{sdl}")
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+    return sdl
+
+
+def get_sdl_response(
+    schema: Schema, query: str, variables: Optional[dict[str, Any]] = None
+) -> Optional[bytes]:
+    """
+    Get the serialized JSON response of the `{ _service { sdl } }` query of the routers,
+    for HTTP integrations to answer it without executing the query.
+
+    Returns None if the query is not that query, which must then be executed as usual.
+
+    :param schema: schema built with `build_schema`
+    :param query: query of the request
+    :param variables: variables of the request
+    """
+    service_sdl: Optional[ServiceSDL] = getattr(schema, "service_sdl", None)
+    if service_sdl is None or variables or get_query_hash(query) != SDL_QUERY_HASH:
+        return None
+    return service_sdl.response
+
+
+def get_service_query(
+    schema: Schema,
+    sdl_hash: bool = False,
+    lazy: bool = False,
+    cache_path: Optional[str | os.PathLike] = None,
+):
     """
     Gets the Service Query for federation
+
+    :param schema: schema to print the SDL of
+    :param sdl_hash: add the `sdlHash` field (SHA-256 digest of the SDL) to `_Service`
+    :param lazy: print the SDL on its first use instead of now
+    :param cache_path: file caching the SDL across the processes, see get_cached_sdl
     """
-    sdl_str = get_sdl(schema)
+    service_sdl = ServiceSDL(
+        partial(get_cached_sdl, schema, cache_path)
+        if cache_path is not None
+        else partial(get_sdl, schema)
+    )
+    if not lazy:
+        # Print it now
+        service_sdl.sdl  # noqa
 
     class _Service(ObjectType):
         sdl = String()
 
         def resolve_sdl(self, _) -> str:  # noqa
-            return sdl_str
+            return service_sdl.sdl
+
+    class _ServiceWithHash(_Service):
+        class Meta:
+            name = "_Service"
+
+        sdl_hash = String(name="sdlHash")
+
+        def resolve_sdl_hash(self, _) -> str:  # noqa
+            return service_sdl.hash
+
+    service_type = _ServiceWithHash if sdl_hash else _Service
 
     class ServiceQuery(ObjectType):
-        _service = Field(_Service, name="_service", required=True)
+        _service = Field(service_type, name="_service", required=True)
 
         def resolve__service(self, info) -> _Service:  # noqa
-            return _Service()
+            return service_type()
 
+    ServiceQuery.service_sdl = service_sdl
     return ServiceQuery
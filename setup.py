@@ -34,7 +34,7 @@ setup(
     download_url=f"https://github.com/graphql-python/graphene-federation/archive/{version}.tar.gz",
     keywords=["graphene", "graphql", "gql", "federation"],
     install_requires=[
-        "graphene>=3.1",
+        "graphene>=3.3",
         "graphql-core>=3.1",
         "graphene-directives>=0.4.6",
     ],
@@ -0,0 +1,222 @@
+"""
+Startup benchmark of `build_schema` on synthetic federated schemas.
+
+Run it with `python -m tests.benchmark`, see `python -m tests.benchmark --help`.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from graphene import Field, ID, Int, ObjectType, String
+from graphql import GraphQLArgument, GraphQLInt, GraphQLNonNull
+
+from graphene_federation import (
+    ComposableDirective,
+    DirectiveLocation,
+    FederationVersion,
+    LATEST_VERSION,
+    STABLE_VERSION,
+    build_schema,
+    external,
+    key,
+    provides,
+    requires,
+)
+from graphene_federation.service import get_sdl
+
+
+@dataclass
+class SyntheticSchema:
+    """
+    Arguments of `build_schema` for a synthetic federated schema.
+    """
+
+    query: type
+    types: list
+    directives: list
+    federation_version: FederationVersion
+
+    def build(self, **kwargs):
+        return build_schema(
+            query=self.query,
+            types=self.types,
+            directives=self.directives or None,
+            federation_version=self.federation_version,
+            **kwargs,
+        )
+
+
+@dataclass
+class BenchmarkResult:
+    entities: int
+    depth: int
+    directives: int
+    federation_version: FederationVersion
+    build_schema_seconds: float
+    get_sdl_seconds: float
+    peak_memory_bytes: int
+    sdl_length: int
+
+
+def make_schema(
+    entities: int,
+    depth: int = 3,
+    directives: int = 0,
+    federation_version: FederationVersion = LATEST_VERSION,
+) -> SyntheticSchema:
+    """
+    Generate new graphene types for a federated schema.
+
+    Each entity has two `@key`, a field `@requires` an external object nested `depth` levels deep
+    and a field `@provides` a field of the previous entity.
+    The custom directives are applied in turn to the entities and to one of their fields.
+
+    :param entities: number of `@key` entities
+    :param depth: nesting depth of the `@requires` field sets
+    :param directives: number of custom `ComposableDirective` (only supported from federation v2)
+    :param federation_version: federation version of the schema
+    """
+    custom_directives = [
+        ComposableDirective(
+            name=f"custom{index}",
+            locations=[DirectiveLocation.FIELD_DEFINITION, DirectiveLocation.OBJECT],
+            args={"maxAge": GraphQLArgument(GraphQLNonNull(GraphQLInt))},
+            spec_url=f"https://specs.example.dev/custom{index}/v1.0",
+            # @composeDirective is not repeatable on the schema
+            add_to_schema_directives=index == 0,
+        )
+        for index in range(directives)
+    ]
+    decorators = [directive.decorator() for directive in custom_directives]
+
+    requires_fields = "value"
+    for _ in range(depth - 1):
+        requires_fields = f"next {{ {requires_fields} }}"
+    requires_fields = f"detail {{ {requires_fields} }}"
+
+    types = []
+    previous_entity = None
+    for index in range(entities):
+        node = None
+        for level in reversed(range(depth)):
+            attributes = {"value": Int()}
+            if node is not None:
+                attributes["next"] = Field(node)
+            node = type(f"Node{index}Level{level}", (ObjectType,), attributes)
+
+        attributes = {
+            "id": ID(required=True),
+            "sku": String(required=True),
+            "name": external(String()),
+            "detail": external(Field(node)),
+            "estimate": requires(String(), fields=requires_fields),
+        }
+        if previous_entity is not None:
+            attributes["related"] = provides(Field(previous_entity), fields="name")
+        if decorators:
+            decorate = decorators[index % len(decorators)]
+            attributes["size"] = decorate(field=Int(), max_age=index)
+
+        entity = type(f"Entity{index}", (ObjectType,), attributes)
+        entity = key("sku")(key("id")(entity))
+        if decorators:
+            entity = decorate(max_age=index)(entity)
+        types.append(entity)
+        previous_entity = entity
+
+    query = type(
+        "Query",
+        (ObjectType,),
+        {"entity": Field(types[0]) if types else String()},
+    )
+    return SyntheticSchema(query, types, custom_directives, federation_version)
+
+
+def _timed(function: Callable):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def run_benchmark(
+    entities: int,
+    depth: int = 3,
+    directives: int = 0,
+    federation_version: FederationVersion = LATEST_VERSION,
+) -> BenchmarkResult:
+    """
+    Measure the time taken by `build_schema` (without printing the SDL) and by `get_sdl`,
+    and the peak memory allocated by both (measured on another build, as tracing slows them down).
+    """
+    synthetic_schema = make_schema(entities, depth, directives, federation_version)
+    gc.collect()
+    schema, build_seconds = _timed(
+        lambda: synthetic_schema.build(service_sdl_lazy=True)
+    )
+    sdl, sdl_seconds = _timed(lambda: get_sdl(schema))
+    del schema
+
+    synthetic_schema = make_schema(entities, depth, directives, federation_version)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        synthetic_schema.build().service_sdl.sdl  # noqa
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        entities=entities,
+        depth=depth,
+        directives=directives,
+        federation_version=federation_version,
+        build_schema_seconds=build_seconds,
+        get_sdl_seconds=sdl_seconds,
+        peak_memory_bytes=peak_memory,
+        sdl_length=len(sdl),
+    )
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entities", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument("--directives", type=int, default=20)
+    parser.add_argument(
+        "--versions",
+        nargs="+",
+        default=[
+            FederationVersion.VERSION_1_0.value,
+            STABLE_VERSION.value,
+            LATEST_VERSION.value,
+        ],
+        choices=[version.value for version in FederationVersion],
+    )
+    args = parser.parse_args(argv)
+
+    print(
+        f"{'version':>8} {'entities':>8} {'build_schema (s)':>16} "
+        f"{'get_sdl (s)':>11} {'peak memory (MB)':>16}"
+    )
+    for version in args.versions:
+        federation_version = FederationVersion(version)
+        # Custom directives are not supported by federation v1
+        directives = (
+            0
+            if federation_version == FederationVersion.VERSION_1_0
+            else args.directives
+        )
+        for entities in args.entities:
+            result = run_benchmark(entities, args.depth, directives, federation_version)
+            print(
+                f"{version:>8} {entities:>8} {result.build_schema_seconds:>16.3f} "
+                f"{result.get_sdl_seconds:>11.3f} "
+                f"{result.peak_memory_bytes / 2**20:>16.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from graphene_federation import FederationVersion, LATEST_VERSION, STABLE_VERSION
+from tests.benchmark import make_schema, run_benchmark
+from tests.util import sdl_query
+
+benchmark = pytest.mark.skipif(
+    not os.environ.get("GRAPHENE_FEDERATION_BENCHMARK"),
+    reason="set GRAPHENE_FEDERATION_BENCHMARK=1 to run the benchmarks",
+)
+
+
+@pytest.mark.parametrize(
+    "federation_version, directives",
+    [
+        (FederationVersion.VERSION_1_0, 0),
+        (STABLE_VERSION, 3),
+        (LATEST_VERSION, 3),
+    ],
+)
+def test_synthetic_schema(federation_version, directives):
+    """
+    Check that the synthetic schemas of the benchmark build and print all their directives.
+    """
+    schema = make_schema(
+        10, depth=4, directives=directives, federation_version=federation_version
+    ).build()
+    sdl = sdl_query(schema)
+
+    assert sdl.count('@key(fields: "id")') == 10
+    assert sdl.count('@key(fields: "sku")') == 10
+    assert sdl.count("next { __typename value } } } }") == 10  # @requires
+    assert sdl.count('@provides(fields: "name")') == 9
+    for index in range(directives):
+        assert f"@custom{index}(maxAge:" in sdl
+    assert "_entities" in schema.graphql_schema.query_type.fields
+
+
+@benchmark
+@pytest.mark.parametrize(
+    "federation_version", [FederationVersion.VERSION_1_0, LATEST_VERSION]
+)
+def test_startup_scales_linearly(federation_version):
+    """
+    Check that the startup time and memory grow linearly with the number of entities.
+    """
+    directives = 0 if federation_version == FederationVersion.VERSION_1_0 else 20
+    small = run_benchmark(100, 5, directives, federation_version)
+    large = run_benchmark(400, 5, directives, federation_version)
+
+    # 4 times more entities, with some leeway for the timing noise
+    assert large.build_schema_seconds < 8 * small.build_schema_seconds
+    assert large.get_sdl_seconds < 8 * small.get_sdl_seconds
+    assert large.peak_memory_bytes < 6 * small.peak_memory_bytes
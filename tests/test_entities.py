@@ -0,0 +1,1349 @@
+import asyncio
+import gc
+import sys
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+import pytest
+from graphene import Enum, Field, ID, Int, Interface, List, ObjectType, String, Union
+from graphql import graphql, graphql_sync
+
+from graphene_federation import EntityCache, LATEST_VERSION, build_schema, key
+from graphene_federation import extends, external, interface_object, key_resolver
+from graphene_federation import requires
+
+
+def _entities_query(selections: str) -> str:
+    return (
+        "query ($representations: [_Any!]!) {"
+        "_entities(representations: $representations) {%s}"
+        "}" % selections
+    )
+
+
+def entities_query(schema, representations: list[dict], selections: str):
+    return graphql_sync(
+        schema.graphql_schema,
+        _entities_query(selections),
+        variable_values={"representations": representations},
+    )
+
+
+def async_entities_query(schema, representations: list[dict], selections: str):
+    return asyncio.run(
+        graphql(
+            schema.graphql_schema,
+            _entities_query(selections),
+            variable_values={"representations": representations},
+        )
+    )
+
+
+def test_batch_reference_resolver():
+    """
+    Check that the batch resolver receives all the instances of its type at once
+    and that the results are returned in the order of the representations.
+    """
+    calls = []
+
+    @key("upc")
+    class Product(ObjectType):
+        upc = ID(required=True)
+        name = String()
+
+        @classmethod
+        def _resolve_references(cls, instances, info):
+            calls.append([instance.upc for instance in instances])
+            return [
+                Product(upc=instance.upc, name=f"product {instance.upc}")
+                for instance in instances
+            ]
+
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+        name = String()
+
+        def __resolve_reference(self, info, **kwargs):
+            return User(id=self.id, name=f"user {self.id}")
+
+    schema = build_schema(types=[Product, User], federation_version=LATEST_VERSION)
+    result = entities_query(
+        schema,
+        [
+            {"__typename": "Product", "upc": "1"},
+            {"__typename": "User", "id": "1"},
+            {"__typename": "Product", "upc": "2"},
+        ],
+        "... on Product { upc name } ... on User { id name }",
+    )
+
+    assert not result.errors
+    assert result.data == {
+        "_entities": [
+            {"upc": "1", "name": "product 1"},
+            {"id": "1", "name": "user 1"},
+            {"upc": "2", "name": "product 2"},
+        ]
+    }
+    assert calls == [["1", "2"]]
+
+
+def test_batch_reference_resolver_wrong_length():
+    @key("upc")
+    class Product(ObjectType):
+        upc = ID(required=True)
+        name = String()
+
+        @classmethod
+        def _resolve_references(cls, instances, info):
+            return instances[:1]
+
+    schema = build_schema(types=[Product], federation_version=LATEST_VERSION)
+    result = entities_query(
+        schema,
+        [{"__typename": "Product", "upc": "1"}, {"__typename": "Product", "upc": "2"}],
+        "... on Product { upc }",
+    )
+
+    assert result.errors
+    assert "returned 1 entities for 2 representations" in str(result.errors[0])
+
+
+def test_nested_representations():
+    """
+    Check that the nested objects, lists and enums of a representation are decoded
+    and that the entities of different types keep the order of the representations.
+    """
+
+    class Unit(Enum):
+        CM = 1
+        INCH = 2
+
+    class Dimension(ObjectType):
+        size = Int()
+        unit = Unit()
+
+    class Warehouse(ObjectType):
+        name = String()
+
+    @key("upc")
+    @extends
+    class Product(ObjectType):
+        upc = external(ID(required=True))
+        dimension = external(Field(Dimension, required=True))
+        warehouses = external(List(Warehouse))
+        shipping = requires(
+            String(), fields="dimension { size unit } warehouses { name }"
+        )
+
+        def resolve_shipping(self, info):
+            names = ",".join(warehouse.name for warehouse in self.warehouses)
+            return f"{self.dimension.size} {self.dimension.unit.name} from {names}"
+
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+
+    schema = build_schema(types=[Product, User], federation_version=LATEST_VERSION)
+    result = entities_query(
+        schema,
+        [
+            {"__typename": "User", "id": "1"},
+            {
+                "__typename": "Product",
+                "upc": "1",
+                "dimension": {"size": 3, "unit": "INCH"},
+                "warehouses": [{"name": "north"}, {"name": "south"}],
+            },
+            {"__typename": "User", "id": "2"},
+        ],
+        "... on Product { upc shipping } ... on User { id }",
+    )
+
+    assert not result.errors
+    assert result.data == {
+        "_entities": [
+            {"id": "1"},
+            {"upc": "1", "shipping": "3 INCH from north,south"},
+            {"id": "2"},
+        ]
+    }
+
+
+def test_async_reference_resolver():
+    """
+    Check that async reference resolvers are awaited concurrently,
+    without exceeding the concurrency limit.
+    """
+    running = []
+    max_running = []
+
+    @key("upc")
+    class Product(ObjectType):
+        upc = ID(required=True)
+        name = String()
+
+        async def __resolve_reference(self, info, **kwargs):
+            running.append(self.upc)
+            max_running.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(self.upc)
+            return Product(upc=self.upc, name=f"product {self.upc}")
+
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+
+        @classmethod
+        async def _resolve_references(cls, instances, info):
+            await asyncio.sleep(0.01)
+            return instances
+
+    schema = build_schema(
+        types=[Product, User],
+        federation_version=LATEST_VERSION,
+        entity_concurrency_limit=2,
+    )
+    result = async_entities_query(
+        schema,
+        [
+            {"__typename": "Product", "upc": "1"},
+            {"__typename": "User", "id": "1"},
+            {"__typename": "Product", "upc": "2"},
+            {"__typename": "Product", "upc": "3"},
+        ],
+        "... on Product { upc name } ... on User { id }",
+    )
+
+    assert not result.errors
+    assert result.data == {
+        "_entities": [
+            {"upc": "1", "name": "product 1"},
+            {"id": "1"},
+            {"upc": "2", "name": "product 2"},
+            {"upc": "3", "name": "product 3"},
+        ]
+    }
+    assert max(max_running) == 2
+
+
+def test_dataloader_reference_resolver():
+    """
+    Check that with the dataloader the duplicate representations of a request
+    are coalesced into a single batch, even across several _entities fields.
+    """
+    calls = []
+
+    @key("upc")
+    class Product(ObjectType):
+        upc = ID(required=True)
+        name = String()
+
+        @classmethod
+        def _resolve_references(cls, instances, info):
+            calls.append(sorted(instance.upc for instance in instances))
+            return [
+                Product(upc=instance.upc, name=f"product {instance.upc}")
+                for instance in instances
+            ]
+
+    schema = build_schema(
+        types=[Product], federation_version=LATEST_VERSION, entity_dataloader=True
+    )
+    query = """
+    query ($first: [_Any!]!, $second: [_Any!]!) {
+        first: _entities(representations: $first) { ... on Product { upc name } }
+        second: _entities(representations: $second) { ... on Product { upc name } }
+    }
+    """
+    result = asyncio.run(
+        graphql(
+            schema.graphql_schema,
+            query,
+            context_value={},
+            variable_values={
+                "first": [
+                    {"__typename": "Product", "upc": "1"},
+                    {"__typename": "Product", "upc": "2"},
+                    {"__typename": "Product", "upc": "1"},
+                ],
+                "second": [{"__typename": "Product", "upc": "2"}],
+            },
+        )
+    )
+
+    assert not result.errors
+    assert result.data == {
+        "first": [
+            {"upc": "1", "name": "product 1"},
+            {"upc": "2", "name": "product 2"},
+            {"upc": "1", "name": "product 1"},
+        ],
+        "second": [{"upc": "2", "name": "product 2"}],
+    }
+    assert calls == [["1", "2"]]
+
+
+def test_dataloader_with_requires():
+    """
+    Check that the dataloader does not coalesce an entity fetched by its key only
+    with the same entity fetched with its @requires fields.
+    """
+
+    @key("id")
+    class Product(ObjectType):
+        id = ID(required=True)
+        price = external(Int())
+        weight = external(Int())
+        estimate = requires(Int(), fields="price weight")
+
+        @classmethod
+        def _resolve_references(cls, instances, info):
+            return instances
+
+        def resolve_estimate(self, info):
+            if self.price is None or self.weight is None:
+                return None
+            return self.price * self.weight
+
+    schema = build_schema(
+        types=[Product], federation_version=LATEST_VERSION, entity_dataloader=True
+    )
+    query = """
+    query ($first: [_Any!]!, $second: [_Any!]!) {
+        first: _entities(representations: $first) { ... on Product { id } }
+        second: _entities(representations: $second) { ... on Product { estimate } }
+    }
+    """
+    result = asyncio.run(
+        graphql(
+            schema.graphql_schema,
+            query,
+            context_value={},
+            variable_values={
+                "first": [{"__typename": "Product", "id": "1"}],
+                "second": [
+                    {"__typename": "Product", "id": "1", "price": 3, "weight": 2}
+                ],
+            },
+        )
+    )
+
+    assert not result.errors
+    assert result.data == {"first": [{"id": "1"}], "second": [{"estimate": 6}]}
+
+
+def test_async_resolution_with_sync_execution():
+    """
+    Check that resolving entities asynchronously under sync execution fails the call
+    with a clear error, without leaving coroutines never awaited.
+    """
+
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+
+        async def __resolve_reference(self, info):
+            return self
+
+    @key("upc")
+    class Product(ObjectType):
+        upc = ID(required=True)
+
+        @classmethod
+        def _resolve_references(cls, instances, info):
+            return instances
+
+    for type_name, options in (
+        ("User", {}),
+        ("Product", {"entity_dataloader": True}),
+    ):
+        schema = build_schema(
+            types=[User, Product], federation_version=LATEST_VERSION, **options
+        )
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            result = entities_query(
+                schema,
+                [{"__typename": type_name, "id": "1", "upc": "1"}] * 2,
+                "__typename",
+            )
+            gc.collect()
+
+        assert result.data is None
+        assert "requires async execution" in result.errors[0].message
+        assert not [warning for warning in caught if "never awaited" in str(warning)]
+
+
+def test_nested_optional_self_referencing_representation():
+    """
+    Check that optional and self referencing nested objects of a representation are decoded.
+    """
+
+    class Category(ObjectType):
+        name = String()
+        parent = Field(lambda: Category)
+
+    @key("upc")
+    @extends
+    class Product(ObjectType):
+        upc = external(ID(required=True))
+        category = external(Field(Category))
+        path = requires(String(), fields="category { name parent { name } }")
+
+        def resolve_path(self, info):
+            return f"{self.category.parent.name}/{self.category.name}"
+
+    schema = build_schema(types=[Product], federation_version=LATEST_VERSION)
+    result = entities_query(
+        schema,
+        [
+            {
+                "__typename": "Product",
+                "upc": "1",
+                "category": {"name": "shoes", "parent": {"name": "clothing"}},
+            }
+        ],
+        "... on Product { path }",
+    )
+
+    assert not result.errors
+    assert result.data == {"_entities": [{"path": "clothing/shoes"}]}
+
+
+def test_entity_field_names():
+    """
+    Check that the schema exposes the field names mapping of the entities and their nested types,
+    including custom field names.
+    """
+
+    class Dimension(ObjectType):
+        size_in_cm = Int()
+
+    @key("product_id")
+    @extends
+    class Product(ObjectType):
+        product_id = external(ID(required=True))
+        dimension = Field(Dimension)
+        label = external(String(name="productLabel"))
+        title = requires(String(), fields="productLabel", auto_case=False)
+
+        def resolve_title(self, info):
+            return self.label
+
+    schema = build_schema(types=[Product], federation_version=LATEST_VERSION)
+
+    assert dict(schema.entity_field_names["Product"]) == {
+        "productId": "product_id",
+        "dimension": "dimension",
+        "productLabel": "label",
+        "title": "title",
+    }
+    assert dict(schema.entity_field_names["Dimension"]) == {"sizeInCm": "size_in_cm"}
+
+    result = entities_query(
+        schema,
+        [{"__typename": "Product", "productId": "1", "productLabel": "shoe"}],
+        "... on Product { productId title }",
+    )
+    assert not result.errors
+    assert result.data == {"_entities": [{"productId": "1", "title": "shoe"}]}
+
+
+def test_entity_construction():
+    """
+    Check that the instances built without the graphene __init__ are equal to the ones built with it,
+    and that a custom __init__ is still called.
+    """
+    inits = []
+
+    @key("upc")
+    class Product(ObjectType):
+        upc = ID(required=True)
+        name = String(default_value="unknown")
+        price = Int()
+
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+        name = String()
+
+        def __init__(self, **kwargs):
+            inits.append(kwargs)
+            super().__init__(**kwargs)
+
+    schema = build_schema(types=[Product, User], federation_version=LATEST_VERSION)
+    query = schema.query()
+
+    product, user = query.resolve_entities(
+        None,
+        [{"__typename": "Product", "upc": "1"}, {"__typename": "User", "id": "1"}],
+    )
+    assert product == Product(upc="1")
+    assert (product.name, product.price) == ("unknown", None)
+    assert user == User(id="1")
+    assert inits == [{"id": "1"}, {"id": "1"}]
+
+
+def test_deduplicate_representations():
+    """
+    Check that the representations sharing the same key are resolved once,
+    unless the deduplication is disabled.
+    """
+    calls = []
+
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+        name = String()
+
+        def __resolve_reference(self, info, **kwargs):
+            calls.append(self.id)
+            return User(id=self.id, name=f"user {self.id}")
+
+    representations = [
+        {"__typename": "User", "id": "1"},
+        {"__typename": "User", "id": "2"},
+        {"__typename": "User", "id": "1"},
+    ]
+    expected = {
+        "_entities": [
+            {"id": "1", "name": "user 1"},
+            {"id": "2", "name": "user 2"},
+            {"id": "1", "name": "user 1"},
+        ]
+    }
+
+    schema = build_schema(types=[User], federation_version=LATEST_VERSION)
+    result = entities_query(schema, representations, "... on User { id name }")
+    assert not result.errors
+    assert result.data == expected
+    assert calls == ["1", "2"]
+
+    calls.clear()
+    schema = build_schema(
+        types=[User], federation_version=LATEST_VERSION, entity_deduplication=False
+    )
+    result = entities_query(schema, representations, "... on User { id name }")
+    assert not result.errors
+    assert result.data == expected
+    assert calls == ["1", "2", "1"]
+
+
+def test_deduplicate_representations_with_requires():
+    """
+    Check that the representations of the same entity with different @requires values
+    are resolved separately.
+    """
+
+    @key("id")
+    class Product(ObjectType):
+        id = ID(required=True)
+        price = external(Int())
+        weight = external(Int())
+        estimate = requires(Int(), fields="price weight")
+
+        def __resolve_reference(self, info, **kwargs):
+            return self
+
+        def resolve_estimate(self, info):
+            return self.price * self.weight
+
+    schema = build_schema(types=[Product], federation_version=LATEST_VERSION)
+    result = entities_query(
+        schema,
+        [
+            {"__typename": "Product", "id": "1", "price": 3, "weight": 2},
+            {"__typename": "Product", "id": "1", "price": 5, "weight": 2},
+            {"__typename": "Product", "id": "1", "weight": 2, "price": 3},
+        ],
+        "... on Product { estimate }",
+    )
+    assert not result.errors
+    assert result.data == {
+        "_entities": [{"estimate": 6}, {"estimate": 10}, {"estimate": 6}]
+    }
+
+
+def test_deduplicate_deep_representations():
+    """
+    Check that the deduplication keys of deeply nested representations are computed
+    without recursion, within the limits on the representations.
+    """
+    calls = []
+
+    class Book(ObjectType):
+        title = String()
+        sequel = Field(lambda: Book)
+
+    class Movie(ObjectType):
+        title = String()
+
+    class Media(Union):
+        class Meta:
+            types = (Book, Movie)
+
+    @key("upc")
+    @extends
+    class Product(ObjectType):
+        upc = external(ID(required=True))
+        media = external(Field(Media))
+        title = requires(String(), fields="media { ... on Book { title } }")
+
+        def __resolve_reference(self, info):
+            calls.append(self.upc)
+            return self
+
+        def resolve_title(self, info):
+            return self.media.title
+
+    # The union values are keyed entirely
+    media = book = {"__typename": "Book", "title": "1"}
+    for level in range(2 * sys.getrecursionlimit()):
+        book["sequel"] = book = {"title": str(level)}
+    representation = {"__typename": "Product", "upc": "1", "media": media}
+
+    schema = build_schema(types=[Product], federation_version=LATEST_VERSION)
+    result = entities_query(schema, [representation] * 2, "... on Product { title }")
+    assert not result.errors
+    assert result.data == {"_entities": [{"title": "1"}] * 2}
+    assert calls == ["1"]
+
+    calls.clear()
+    schema = build_schema(
+        types=[Product], federation_version=LATEST_VERSION, entity_max_depth=3
+    )
+    result = entities_query(schema, [representation] * 2, "... on Product { title }")
+    assert result.data is None
+    assert "depth of 3" in result.errors[0].message
+    assert calls == []
+
+
+def test_entity_cache():
+    """
+    Check that a shared entity cache is consulted before the reference resolvers,
+    and that it evicts the least recently used and expired entities.
+    """
+    calls = []
+
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+        name = String()
+
+        def __resolve_reference(self, info, **kwargs):
+            calls.append(self.id)
+            return User(id=self.id, name=f"user {self.id}")
+
+    cache = EntityCache(max_size=2)
+    schema = build_schema(
+        types=[User], federation_version=LATEST_VERSION, entity_cache=cache
+    )
+
+    def query(*ids):
+        result = entities_query(
+            schema,
+            [{"__typename": "User", "id": id_} for id_ in ids],
+            "... on User { id name }",
+        )
+        assert not result.errors
+        return [user["name"] for user in result.data["_entities"]]
+
+    assert query("1", "2") == ["user 1", "user 2"]
+    assert query("2", "1") == ["user 2", "user 1"]
+    assert calls == ["1", "2"]
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    assert query("3") == ["user 3"]
+    assert len(cache) == 2
+    assert query("2", "1") == ["user 2", "user 1"]
+    assert calls == ["1", "2", "3", "2"]
+
+    cache.ttl = 0
+    cache.clear()
+    assert query("1") == query("1") == ["user 1"]
+    assert calls == ["1", "2", "3", "2", "1", "1"]
+
+
+def test_entity_cache_per_request():
+    calls = []
+
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+
+        def __resolve_reference(self, info, **kwargs):
+            calls.append(self.id)
+            return self
+
+    schema = build_schema(
+        types=[User], federation_version=LATEST_VERSION, entity_cache=True
+    )
+    context = {}
+    for _ in range(2):
+        result = graphql_sync(
+            schema.graphql_schema,
+            _entities_query("... on User { id }"),
+            context_value=context,
+            variable_values={"representations": [{"__typename": "User", "id": "1"}]},
+        )
+        assert not result.errors
+
+    assert calls == ["1"]
+    assert context["_federation_entities"]["cache"].hits == 1
+
+
+def test_entity_cache_with_requires():
+    """
+    Check that an entity fetched by its key only is not served from the cache
+    when it is fetched again with its @requires fields.
+    """
+
+    @key("id")
+    class Product(ObjectType):
+        id = ID(required=True)
+        price = external(Int())
+        weight = external(Int())
+        estimate = requires(Int(), fields="price weight")
+
+        def __resolve_reference(self, info, **kwargs):
+            return self
+
+        def resolve_estimate(self, info):
+            if self.price is None or self.weight is None:
+                return None
+            return self.price * self.weight
+
+    schema = build_schema(
+        types=[Product], federation_version=LATEST_VERSION, entity_cache=True
+    )
+    query = """
+    query ($first: [_Any!]!, $second: [_Any!]!) {
+        first: _entities(representations: $first) { ... on Product { id } }
+        second: _entities(representations: $second) { ... on Product { estimate } }
+    }
+    """
+    result = graphql_sync(
+        schema.graphql_schema,
+        query,
+        context_value={},
+        variable_values={
+            "first": [{"__typename": "Product", "id": "1"}],
+            "second": [{"__typename": "Product", "id": "1", "price": 3, "weight": 2}],
+        },
+    )
+
+    assert not result.errors
+    assert result.data == {"first": [{"id": "1"}], "second": [{"estimate": 6}]}
+
+
+def test_executor_reference_resolver():
+    """
+    Check that the blocking reference resolvers run concurrently on the executor,
+    and that the entities keep the order of the representations.
+    """
+    # Only passes if the three resolvers below are running at the same time
+    barrier = threading.Barrier(3, timeout=5)
+
+    @key("upc")
+    class Product(ObjectType):
+        upc = ID(required=True)
+        name = String()
+
+        def __resolve_reference(self, info, **kwargs):
+            barrier.wait()
+            return Product(upc=self.upc, name=f"product {self.upc}")
+
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+        name = String()
+
+        @classmethod
+        def _resolve_references(cls, instances, info):
+            barrier.wait()
+            return [User(id=user.id, name=f"user {user.id}") for user in instances]
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        schema = build_schema(
+            types=[Product, User],
+            federation_version=LATEST_VERSION,
+            entity_executor=executor,
+        )
+        representations = [
+            {"__typename": "Product", "upc": "1"},
+            {"__typename": "User", "id": "1"},
+            {"__typename": "Product", "upc": "2"},
+            {"__typename": "User", "id": "2"},
+        ]
+        selections = "... on Product { name } ... on User { name }"
+        expected = {
+            "_entities": [
+                {"name": "product 1"},
+                {"name": "user 1"},
+                {"name": "product 2"},
+                {"name": "user 2"},
+            ]
+        }
+
+        result = entities_query(schema, representations, selections)
+        assert not result.errors
+        assert result.data == expected
+
+        barrier.reset()
+        result = async_entities_query(schema, representations, selections)
+        assert not result.errors
+        assert result.data == expected
+
+
+def test_deeply_nested_representation():
+    """
+    Check that the nested representations are walked without recursion,
+    without mutating the given representation,
+    and only decoded down to the depth of the @requires field set.
+    """
+
+    class Category(ObjectType):
+        name = String()
+        parent = Field(lambda: Category)
+
+    @key("upc")
+    @extends
+    class Product(ObjectType):
+        upc = external(ID(required=True))
+        categories = external(List(Category))
+        path = requires(String(), fields="categories { name parent { name } }")
+
+    schema = build_schema(types=[Product], federation_version=LATEST_VERSION)
+
+    depth = sys.getrecursionlimit() * 2
+    category = {"name": "0"}
+    for level in range(1, depth):
+        category = {"name": str(level), "parent": category}
+    representation = {"__typename": "Product", "upc": "1", "categories": [category]}
+
+    (product,) = schema.query().resolve_entities(None, [representation])
+
+    while category is not None:
+        assert "__typename" not in category
+        category = category.get("parent")
+
+    category = product.categories[0]
+    assert isinstance(category, Category)
+    assert category.name == str(depth - 1)
+    assert category.parent == Category(name=str(depth - 2))
+
+
+def test_read_only_representations():
+    """
+    Check that the representations are decoded from read only mappings.
+    """
+
+    class Dimension(ObjectType):
+        size = Int()
+
+    @key("upc")
+    @extends
+    class Product(ObjectType):
+        upc = external(ID(required=True))
+        dimensions = external(List(Dimension))
+        size = requires(Int(), fields="dimensions { size }")
+
+    schema = build_schema(types=[Product], federation_version=LATEST_VERSION)
+    representation = MappingProxyType(
+        {
+            "__typename": "Product",
+            "upc": "1",
+            "dimensions": (MappingProxyType({"size": 2}),),
+        }
+    )
+
+    (product,) = schema.query().resolve_entities(None, [representation])
+
+    assert product.upc == "1"
+    assert product.dimensions[0] == Dimension(size=2)
+
+
+def test_partial_entities():
+    """
+    Check that a failing representation only fails its own entity,
+    the other entities being returned next to located errors.
+    """
+
+    class Color(Enum):
+        RED = 1
+
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+
+        def __resolve_reference(self, info):
+            if self.id == "error":
+                raise ValueError("unknown user")
+            return self
+
+    @key("upc")
+    @extends
+    class Product(ObjectType):
+        upc = external(ID(required=True))
+        color = external(Color())
+        label = requires(String(), fields="color")
+
+        @classmethod
+        def _resolve_references(cls, instances, info):
+            return instances
+
+    schema = build_schema(types=[User, Product], federation_version=LATEST_VERSION)
+    representations = [
+        {"__typename": "User", "id": "1"},
+        {"__typename": "Unknown", "id": "1"},
+        {"__typename": "Product", "upc": "1", "color": "RED"},
+        {"__typename": "Product", "upc": "2", "color": "BLUE"},
+        {"__typename": "User", "id": "error"},
+        "oops",
+    ]
+    selections = "... on User { id } ... on Product { upc }"
+
+    for result in (
+        entities_query(schema, representations, selections),
+        async_entities_query(schema, representations, selections),
+    ):
+        assert result.data == {
+            "_entities": [{"id": "1"}, None, {"upc": "1"}, None, None, None]
+        }
+        errors = {error.path[1]: error.message for error in result.errors}
+        assert all(error.path[0] == "_entities" for error in result.errors)
+        assert sorted(errors) == [1, 3, 4, 5]
+        assert "Unknown" in errors[1]
+        assert "BLUE" in errors[3]
+        assert errors[4] == "unknown user"
+        assert errors[5] == "Representation must be an object"
+
+
+def test_representation_limits():
+    """
+    Check that the limits on the representations fail the whole call
+    before any reference resolver runs.
+    """
+    calls = []
+
+    class Category(ObjectType):
+        name = String()
+        parent = Field(lambda: Category)
+
+    @key("upc")
+    @extends
+    class Product(ObjectType):
+        upc = external(ID(required=True))
+        category = external(Field(Category))
+        path = requires(
+            String(), fields="category { name parent { name parent { name } } }"
+        )
+
+        def __resolve_reference(self, info):
+            calls.append(self.upc)
+            return self
+
+    def representation(upc: str, depth: int) -> dict:
+        category = None
+        for level in range(depth):
+            category = {"name": str(level), "parent": category}
+        return {"__typename": "Product", "upc": upc, "category": category}
+
+    schema = build_schema(
+        types=[Product],
+        federation_version=LATEST_VERSION,
+        entity_max_representations=3,
+        entity_max_depth=3,
+        entity_max_nodes=6,
+    )
+
+    result = entities_query(
+        schema, [representation("1", 2), representation("2", 2)], "__typename"
+    )
+    assert not result.errors
+    assert calls == ["1", "2"]
+
+    calls.clear()
+    for representations, message in (
+        ([representation(str(upc), 0) for upc in range(4)], "Too many"),
+        ([representation("1", 0), representation("2", 3)], "depth of 3"),
+        ([representation("1", 2), representation("2", 2), representation("3", 0)], "6"),
+    ):
+        result = entities_query(schema, representations, "__typename")
+        assert result.data is None
+        assert message in result.errors[0].message
+        assert calls == []
+
+
+def test_entity_descriptors():
+    """
+    Check the table of the entity descriptors and the rejection of the
+    representations of the types which are not entities.
+    """
+
+    class Dimension(ObjectType):
+        size = Int()
+
+    @key("id")
+    @key("sku upc")
+    class Product(ObjectType):
+        id = ID(required=True)
+        sku = String()
+        upc = String()
+        dimension = Field(Dimension)
+
+        @classmethod
+        def _resolve_references(cls, instances, info):
+            return instances
+
+    schema = build_schema(types=[Product], federation_version=LATEST_VERSION)
+    descriptors = schema.query.entity_descriptors
+
+    assert list(descriptors) == ["Product"]
+    descriptor = descriptors["Product"]
+    assert descriptor.model is Product
+    assert descriptor.key_fields == {"id", "sku", "upc"}
+    assert descriptor.resolver is None
+    assert descriptor.batch_resolver is not None
+    assert descriptor.decoder.model is Product
+
+    (_, not_entity, unknown, missing) = schema.query().resolve_entities(
+        None,
+        [
+            {"__typename": "Product", "id": "1"},
+            {"__typename": "Dimension", "size": 1},
+            {"__typename": "Unknown", "id": "1"},
+            {"id": "1"},
+        ],
+    )
+    assert str(not_entity) == "Type 'Dimension' of representation is not an entity"
+    assert str(unknown) == "Unknown type in representation: 'Unknown'"
+    assert str(missing) == "Representation is missing its __typename"
+
+
+def test_key_resolvers():
+    """
+    Check that the representations are resolved by the resolver of their key,
+    the ones of the keys without resolver falling back to the entity resolver.
+    """
+    calls = []
+
+    class Package(ObjectType):
+        package_id = ID()
+
+    @key("id")
+    @key("sku package { package_id }")
+    @key("upc")
+    class Product(ObjectType):
+        id = ID()
+        sku = String()
+        upc = String()
+        package = Field(Package)
+
+        @key_resolver("id")
+        def resolve_by_id(cls, instances, info):
+            calls.append(("id", [instance.id for instance in instances]))
+            return instances
+
+        @key_resolver("sku package { package_id }")
+        @classmethod
+        def resolve_by_sku(cls, instances, info):
+            calls.append(("sku", [instance.sku for instance in instances]))
+            return instances
+
+        def __resolve_reference(self, info):
+            calls.append(("upc", self.upc))
+            return self
+
+    schema = build_schema(types=[Product], federation_version=LATEST_VERSION)
+    (product,) = schema.query.entity_descriptors.values()
+    assert [fields for fields, _ in product.key_descriptors] == [
+        {"sku", "package"},
+        {"id"},
+    ]
+
+    result = entities_query(
+        schema,
+        [
+            {"__typename": "Product", "id": "1"},
+            {"__typename": "Product", "sku": "a", "package": {"packageId": "p"}},
+            {"__typename": "Product", "upc": "u"},
+            {"__typename": "Product", "id": "2"},
+        ],
+        "... on Product { id sku upc }",
+    )
+
+    assert not result.errors
+    assert [
+        entity["id"] or entity["sku"] or entity["upc"]
+        for entity in result.data["_entities"]
+    ] == ["1", "a", "u", "2"]
+    assert sorted(calls) == [("id", ["1", "2"]), ("sku", ["a"]), ("upc", "u")]
+
+    # The routes are memoized per set of key fields, not per set of fields sent
+    for index in range(10):
+        assert product.route({"id": "1", f"field{index}": 1}) is product.route(
+            {"id": "2"}
+        )
+    assert len(product._routes) == 3  # noqa
+
+
+def test_key_resolver_without_key():
+    """
+    Check that a key resolver must match one of the @key of its entity.
+    """
+
+    @key("id")
+    class Product(ObjectType):
+        id = ID(required=True)
+        upc = String()
+
+        @key_resolver("upc")
+        def resolve_by_upc(cls, instances, info):
+            return instances
+
+    with pytest.raises(ValueError, match="not the fields of one of its @key"):
+        build_schema(types=[Product], federation_version=LATEST_VERSION)
+
+
+def test_undeclared_fields_ignored():
+    """
+    Check that only the @key and @requires fields of the representations are decoded.
+    """
+
+    class Color(Enum):
+        RED = 1
+
+    class Dimension(ObjectType):
+        size = Int()
+        color = Field(Color)
+
+    @key("upc")
+    @extends
+    class Product(ObjectType):
+        upc = external(ID(required=True))
+        name = external(String())
+        dimension = external(Field(Dimension))
+        size = requires(Int(), fields="dimension { size }")
+
+    schema = build_schema(types=[Product], federation_version=LATEST_VERSION)
+
+    (product,) = schema.query().resolve_entities(
+        None,
+        [
+            {
+                "__typename": "Product",
+                "upc": "1",
+                "name": "shoe",
+                "unknown": "value",
+                "dimension": {"size": 2, "color": "NOT A COLOR"},
+            }
+        ],
+    )
+
+    assert product == Product(upc="1", dimension=Dimension(size=2))
+
+
+def test_interface_entities():
+    """
+    Check that the representations of an interface entity are resolved
+    by the resolvers of their concrete type, with a single type resolution call.
+    """
+    calls = []
+
+    @key("id")
+    class Media(Interface):
+        id = ID(required=True)
+
+        @classmethod
+        def _resolve_reference_types(cls, representations, info):
+            calls.append([representation["id"] for representation in representations])
+            return [
+                {"b": "Book", "m": Movie}.get(representation["id"][0], "Media")
+                for representation in representations
+            ]
+
+    @key("id")
+    class Book(ObjectType):
+        class Meta:
+            interfaces = (Media,)
+
+        title = String()
+
+        @classmethod
+        def _resolve_references(cls, instances, info):
+            calls.append([instance.id for instance in instances])
+            return [Book(id=book.id, title=f"book {book.id}") for book in instances]
+
+    @key("id")
+    class Movie(ObjectType):
+        class Meta:
+            interfaces = (Media,)
+
+    @key("id")
+    @interface_object
+    class Product(ObjectType):
+        id = ID(required=True)
+
+    schema = build_schema(
+        types=[Book, Movie, Product], federation_version=LATEST_VERSION
+    )
+    assert "union _Entity = Book | Movie | Product" in str(schema)
+
+    result = entities_query(
+        schema,
+        [
+            {"__typename": "Media", "id": "b1"},
+            {"__typename": "Book", "id": "b2"},
+            {"__typename": "Media", "id": "m1"},
+            {"__typename": "Media", "id": "x1"},
+            {"__typename": "Product", "id": "p1"},
+        ],
+        "__typename ... on Media { id } ... on Book { title } ... on Product { id }",
+    )
+
+    assert result.data == {
+        "_entities": [
+            {"__typename": "Book", "id": "b1", "title": "book b1"},
+            {"__typename": "Book", "id": "b2", "title": "book b2"},
+            {"__typename": "Movie", "id": "m1"},
+            None,
+            {"__typename": "Product", "id": "p1"},
+        ]
+    }
+    assert [error.path for error in result.errors] == [["_entities", 3]]
+    assert calls == [["b1", "m1", "x1"], ["b2", "b1"]]
+
+
+def test_interface_entities_limits():
+    """
+    Check that the limits on the representations of an interface entity are checked
+    before its `__resolve_reference_types` hook runs.
+    """
+    calls = []
+
+    @key("id")
+    class Media(Interface):
+        id = ID(required=True)
+
+        @classmethod
+        def _resolve_reference_types(cls, representations, info):
+            calls.append(len(representations))
+            return ["Book"] * len(representations)
+
+    @key("id")
+    class Book(ObjectType):
+        class Meta:
+            interfaces = (Media,)
+
+    schema = build_schema(
+        types=[Book], federation_version=LATEST_VERSION, entity_max_nodes=2
+    )
+    representations = [{"__typename": "Media", "id": str(index)} for index in range(3)]
+
+    result = entities_query(schema, representations[:2], "... on Book { id }")
+    assert result.data == {"_entities": [{"id": "0"}, {"id": "1"}]}
+    assert calls == [2]
+
+    calls.clear()
+    result = entities_query(schema, representations, "... on Book { id }")
+    assert result.data is None
+    assert "max number of 2 objects" in result.errors[0].message
+    assert calls == []
+
+
+def test_entity_timeout():
+    """
+    Check that the reference resolvers still running past the timeout are cancelled,
+    the entities resolved by then being returned.
+    """
+    cancelled = []
+
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+
+        async def __resolve_reference(self, info):
+            if self.id == "slow":
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(self.id)
+                    raise
+            return self
+
+    schema = build_schema(
+        types=[User], federation_version=LATEST_VERSION, entity_timeout=0.05
+    )
+
+    result = async_entities_query(
+        schema,
+        [
+            {"__typename": "User", "id": "1"},
+            {"__typename": "User", "id": "slow"},
+            {"__typename": "User", "id": "2"},
+        ],
+        "... on User { id }",
+    )
+
+    assert result.data == {"_entities": [{"id": "1"}, None, {"id": "2"}]}
+    assert [(error.path, error.message) for error in result.errors] == [
+        (["_entities", 1], "Entity resolution exceeded its deadline")
+    ]
+    assert cancelled == ["slow"]
+
+
+def test_entity_chunks():
+    """
+    Check that the chunks of representations are resolved one after the other,
+    while the entities of the previous chunks are serialized.
+    """
+    events = []
+
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+        name = String()
+
+        @classmethod
+        def _resolve_references(cls, instances, info):
+            events.append([instance.id for instance in instances])
+            return instances
+
+        def resolve_name(self, info):
+            events.append(self.id)
+            return f"user {self.id}"
+
+    @key("id")
+    class Account(ObjectType):
+        id = ID(required=True)
+
+        @classmethod
+        async def _resolve_references(cls, instances, info):
+            return instances
+
+    schema = build_schema(
+        types=[User, Account], federation_version=LATEST_VERSION, entity_chunk_size=2
+    )
+    representations = [{"__typename": "User", "id": str(i)} for i in range(5)]
+
+    result = entities_query(schema, representations, "... on User { name }")
+
+    assert not result.errors
+    assert result.data == {"_entities": [{"name": f"user {i}"} for i in range(5)]}
+    assert events == [["0", "1"], "0", "1", ["2", "3"], "2", "3", ["4"], "4"]
+
+    result = async_entities_query(
+        schema,
+        [{"__typename": "Account", "id": str(i)} for i in range(3)]
+        + [{"__typename": "User", "id": "5"}],
+        "... on Account { id } ... on User { id }",
+    )
+    assert not result.errors
+    assert result.data == {
+        "_entities": [{"id": "0"}, {"id": "1"}, {"id": "2"}, {"id": "5"}]
+    }
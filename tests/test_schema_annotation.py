@@ -1,6 +1,6 @@
 from pathlib import Path
 
-from graphene import Field, ID, ObjectType, String
+from graphene import Field, ID, ObjectType, String, relay
 from graphene import NonNull
 from graphql import graphql_sync
 
@@ -130,3 +130,58 @@ def test_chat_schema():
     result = graphql_sync(chat_schema.graphql_schema, query)
     assert not result.errors
     assert result.data == {"message": {"text": "Don't be rude Jack", "userId": "3"}}
+
+
+def test_schema_builds(monkeypatch):
+    """
+    Check that the schema is only built twice: once to print its SDL
+    and once with the federation fields added to the query.
+    """
+    import graphene_federation.schema
+
+    builds = []
+    build_directive_schema = graphene_federation.schema.build_directive_schema
+
+    def counted_build(*args, **kwargs):
+        builds.append(kwargs.get("schema_directives"))
+        return build_directive_schema(*args, **kwargs)
+
+    monkeypatch.setattr(
+        graphene_federation.schema, "build_directive_schema", counted_build
+    )
+
+    schema = build_schema(query=UserQuery, federation_version=LATEST_VERSION)
+
+    assert len(builds) == 2
+    # Same SDL as the one stored for the user schema
+    gql_dir = Path(__file__).parent / "gql" / "test_schema_annotation"
+    assert str(schema) == (gql_dir / "test_user_schema_1.graphql").read_text()
+    assert sdl_query(schema) == (gql_dir / "test_user_schema_2.graphql").read_text()
+
+
+def test_relay_page_info():
+    """
+    Check the SDL of a schema with a relay connection, its PageInfo type being shareable.
+    """
+
+    @key("id")
+    class Product(ObjectType):
+        class Meta:
+            interfaces = (relay.Node,)
+
+        name = String()
+
+    class ProductConnection(relay.Connection):
+        class Meta:
+            node = Product
+
+    class Query(ObjectType):
+        products = relay.ConnectionField(ProductConnection)
+
+    schema = build_schema(query=Query, federation_version=LATEST_VERSION)
+
+    # save_file(str(schema), "1")
+    # save_file(sdl_query(schema), "2")
+
+    assert open_file("1") == str(schema)
+    assert open_file("2") == sdl_query(schema)
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from graphene import Argument, Enum, Field, ID, InputObjectType, ObjectType, String
+from graphql import graphql_sync
+
+from graphene_federation import (
+    LATEST_VERSION,
+    build_schema,
+    get_sdl_response,
+    inaccessible,
+    key,
+)
+from graphene_federation import service
+
+
+def build_user_schema():
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+
+    return build_schema(types=[User], federation_version=LATEST_VERSION)
+
+
+def test_sdl_response():
+    """
+    Check that the serialized response of the SDL query is the one of its execution.
+    """
+    schema = build_user_schema()
+    query = "query { _service { sdl } }"
+
+    response = get_sdl_response(schema, query)
+
+    assert response is not None
+    assert json.loads(response) == graphql_sync(schema.graphql_schema, query).formatted
+
+
+def test_sdl_response_query_forms():
+    """
+    Check that the SDL query is recognised whatever its formatting,
+    and that the other queries are not.
+    """
+    schema = build_user_schema()
+
+    for query in [
+        "{ _service { sdl } }",
+        "{_service{sdl}}",
+        "query SubgraphIntrospectQuery {\n"
+        "    # eslint-disable-next-line\n"
+        "    _service {\n"
+        "        sdl\n"
+        "    }\n"
+        "}",
+    ]:
+        assert get_sdl_response(schema, query) == schema.service_sdl.response
+
+    for query in [
+        "{ _service { sdl } __typename }",
+        "{ _service { s: sdl } }",
+        "mutation { _service { sdl } }",
+        "query ($a: Int) { _service { sdl } }",
+        "{ _entities(representations: []) { __typename } }",
+    ]:
+        assert get_sdl_response(schema, query) is None
+
+    assert get_sdl_response(schema, "{ _service { sdl } }", {"a": 1}) is None
+
+
+def test_sdl_hash():
+    """
+    Check that the SDL digest is stable and optionally exposed on _service.
+    """
+    schema = build_user_schema()
+    sdl = schema.service_sdl.sdl
+
+    assert schema.service_sdl.hash == build_user_schema().service_sdl.hash
+    assert schema.service_sdl.hash == hashlib.sha256(sdl.encode()).hexdigest()
+    assert schema.service_sdl.etag == f'"{schema.service_sdl.hash}"'
+    assert "sdlHash" not in str(schema)
+
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+
+    schema = build_schema(
+        types=[User], federation_version=LATEST_VERSION, service_sdl_hash=True
+    )
+    result = graphql_sync(schema.graphql_schema, "{ _service { sdl sdlHash } }")
+
+    assert not result.errors
+    assert result.data["_service"] == {"sdl": sdl, "sdlHash": schema.service_sdl.hash}
+
+
+def test_lazy_sdl(monkeypatch):
+    """
+    Check that a lazy SDL is only printed on its first use.
+    """
+    printed = []
+    monkeypatch.setattr(
+        service, "get_sdl", lambda schema: printed.append(schema) or "type A"
+    )
+
+    @key("id")
+    class User(ObjectType):
+        id = ID(required=True)
+
+    schema = build_schema(
+        types=[User], federation_version=LATEST_VERSION, service_sdl_lazy=True
+    )
+    assert printed == []
+
+    result = graphql_sync(schema.graphql_schema, "{ _service { sdl } }")
+    assert result.data == {"_service": {"sdl": "type A"}}
+    assert schema.service_sdl.hash == hashlib.sha256(b"type A").hexdigest()
+    assert len(printed) == 1
+
+
+def test_lazy_sdl_threads():
+    """
+    Check that a lazy SDL read by concurrent threads is printed once.
+    """
+    printed = []
+
+    def printer() -> str:
+        time.sleep(0.01)
+        printed.append(None)
+        return "type A"
+
+    service_sdl = service.ServiceSDL(printer)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        sdls = list(executor.map(lambda _: service_sdl.sdl, range(8)))
+
+    assert sdls == ["type A"] * 8
+    assert len(printed) == 1
+
+
+def test_sdl_cache(tmp_path):
+    """
+    Check that the SDL cached on disk is reused for the same type definitions only.
+    """
+    cache_path = tmp_path / "schema.graphql"
+
+    def build(description: str):
+        @key("id")
+        class User(ObjectType):
+            id = ID(required=True, description=description)
+
+        return build_schema(
+            types=[User],
+            federation_version=LATEST_VERSION,
+            service_sdl_cache=cache_path,
+        )
+
+    sdl = build("first").service_sdl.sdl
+    fingerprint, cached_sdl = cache_path.read_text().split("\n", 1)
+    assert cached_sdl == sdl
+
+    # The cached SDL is used as is
+    cache_path.write_text(f"{fingerprint}\ncached")
+    assert build("first").service_sdl.sdl == "cached"
+
+    # and replaced when the type definitions change
+    sdl = build("second").service_sdl.sdl
+    assert '"""second"""' in sdl
+    assert cache_path.read_text() != f"{fingerprint}\ncached"
+    assert cache_path.read_text().split("\n", 1)[1] == sdl
+
+
+def test_sdl_cache_directives(tmp_path):
+    """
+    Check that the SDL cached on disk is not reused when only a directive changes,
+    on a field argument, an input field or an enum value.
+    """
+    cache_path = tmp_path / "schema.graphql"
+
+    def build(target: str):
+        def directive(name: str, value):
+            return inaccessible(value) if name == target else value
+
+        class Color(Enum):
+            RED = 1
+            BLUE = 2
+
+        if target == "enum":
+            inaccessible(Color.RED)
+
+        class Filter(InputObjectType):
+            name = directive("input", String())
+
+        class Query(ObjectType):
+            # Keeps @inaccessible imported whatever the target
+            hidden = inaccessible(String())
+            user = Field(
+                String,
+                id=directive("argument", Argument(String)),
+                filter=Argument(Filter),
+                color=Argument(Color),
+            )
+
+        return build_schema(
+            query=Query,
+            federation_version=LATEST_VERSION,
+            service_sdl_cache=cache_path,
+        )
+
+    build("")
+    for target in ["argument", "input", "enum"]:
+        sdl = build(target).service_sdl.sdl
+        assert sdl.count(" @inaccessible") == 2
+        assert cache_path.read_text().split("\n", 1)[1] == sdl
+
+        # Removing the directive prints the SDL again
+        sdl = build("").service_sdl.sdl
+        assert sdl.count(" @inaccessible") == 1
+        assert cache_path.read_text().split("\n", 1)[1] == sdl